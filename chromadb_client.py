@@ -1,118 +1,744 @@
 import chromadb
+import contextlib
+import copy
 import json
-from typing import List, Dict, Any
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Hashable, Callable, Iterable, Iterator
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from embedding_cache import CachedEmbeddingFunction
+from hybrid_search import BM25Index, LEXICAL_FIELDS, reciprocal_rank_fusion
+from workflow_library import build_workflow_document
+
+class TTLCache:
+    def __init__(self, max_size: int = 256, ttl: float = 300):
+        """Thread-safe in-process LRU cache whose entries expire after `ttl` seconds"""
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # Bumped on clear() so results computed before an invalidation are not stored after it
+        self.generation = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return a cached value (refreshing its LRU position) or None on miss/expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def set(self, key: Hashable, value: Any, generation: Optional[int] = None):
+        """Store a value, evicting the least recently used entry when full"""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        """Drop all entries (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl
+            }
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a search query so trivially different phrasings share a cache key"""
+    return " ".join(query.lower().split())
+
+
+CHROMA_BACKENDS = ("http", "persistent", "numpy")
+
+
+def create_chroma_client(backend: str = "http", host: str = "localhost", port: int = 8000,
+                         path: str = "./chroma_data"):
+    """Create a ChromaDB-compatible client for the selected backend
+    
+    http: remote ChromaDB server. persistent: in-process chromadb.PersistentClient at `path`.
+    numpy: in-process exact cosine index stored under `path` (no server, suited to small catalogs).
+    """
+    if backend == "http":
+        return chromadb.HttpClient(host=host, port=port)
+    if backend == "persistent":
+        return chromadb.PersistentClient(path=path)
+    if backend == "numpy":
+        from local_vector_index import LocalVectorClient
+        return LocalVectorClient(path=path)
+    raise ValueError(f"Unknown ChromaDB backend '{backend}' (expected one of {', '.join(CHROMA_BACKENDS)})")
+
+
+class ChromaUnavailableError(RuntimeError):
+    """Raised when ChromaDB can't be reached and the operation can't be served from the snapshot"""
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30):
+        """Closed -> open after `failure_threshold` consecutive failures; half-open probe after `reset_timeout`"""
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._state = "closed"
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._state = "half_open"
+            return self._state
+    
+    def allow_request(self) -> bool:
+        return self.state != "open"
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = "closed"
+            self.opened_at = None
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == "half_open" or self.failures >= self.failure_threshold:
+                self._state = "open"
+                self.opened_at = time.monotonic()
+
+
+class _GuardedCollection:
+    READ_METHODS = ("count", "get", "query")
+    
+    def __init__(self, owner: "WorkflowChromaDB", collection):
+        """Collection proxy that reports outcomes to the circuit breaker and falls back to the snapshot on reads"""
+        self._owner = owner
+        self._collection = collection
+    
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+        
+        def call(*args, **kwargs):
+            try:
+                result = attr(*args, **kwargs)
+            except Exception as e:
+                self._owner.breaker.record_failure()
+                snapshot = self._owner._snapshot_collection() if name in self.READ_METHODS else None
+                if snapshot is None:
+                    raise
+                print(f"⚠️ ChromaDB {name} failed ({e}); serving from local snapshot")
+                return getattr(snapshot, name)(*args, **kwargs)
+            self._owner.breaker.record_success()
+            return result
+        return call
+
+
+class _ReadOnlyCollection:
+    def __init__(self, collection):
+        """Snapshot collection exposed while ChromaDB is unavailable; writes are rejected"""
+        self._collection = collection
+    
+    def __getattr__(self, name):
+        if name in ("add", "upsert", "update", "delete", "modify"):
+            def reject(*args, **kwargs):
+                raise ChromaUnavailableError("ChromaDB is unavailable; running in read-only degraded mode")
+            return reject
+        return getattr(self._collection, name)
+
 
 class WorkflowChromaDB:
-    def __init__(self, host: str = "localhost", port: int = 8000):
-        """Initialize ChromaDB client for server connection"""
-        self.client = chromadb.HttpClient(host=host, port=port)
+    def __init__(self, host: str = "localhost", port: int = 8000, cache_size: int = 256, cache_ttl: float = 300,
+                 embedding_function: Optional[Callable] = None, embedding_cache_path: Optional[str] = None,
+                 stats_path: Optional[str] = ".chroma_stats.json", backend: str = "http",
+                 path: str = "./chroma_data", hybrid_search: bool = True,
+                 snapshot_path: Optional[str] = "./chroma_snapshot", heartbeat_interval: float = 30,
+                 failure_threshold: int = 3, reset_timeout: float = 30):
+        """Initialize ChromaDB client (connects lazily on first use)"""
+        self.backend = backend
+        self.host = host
+        self.port = port
+        self.path = path
+        self.client = None
+        self._collection = None
+        self._connect_lock = threading.Lock()
+        
+        # Health monitoring: circuit breaker, background heartbeat and a local read-only snapshot
+        self.breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout)
+        self.heartbeat_interval = heartbeat_interval
+        self.snapshot_path = snapshot_path
+        self._snapshot = None
+        self._last_heartbeat = None
+        self._monitor_thread = None
+        self._stop_monitor = threading.Event()
+        
+        # Per-domain counters kept incrementally and persisted in a small sidecar file
+        self.stats_path = stats_path
+        self.stats_key = f"{host}:{port}/n8n_workflows" if backend == "http" else f"{backend}:{path}/n8n_workflows"
+        self._stats_lock = threading.Lock()
+        self._write_stamp = 0.0
+        self._domain_counts = None
+        
+        # Optional on-disk embedding cache shared across processes (wraps the given or default function)
+        if embedding_cache_path:
+            embedding_function = CachedEmbeddingFunction(embedding_function, path=embedding_cache_path)
+        self.embedding_function = embedding_function
         
-        # Test connection
+        # Search results keyed on (normalized query, domain, n_results); cleared on every write
+        self.query_cache = TTLCache(max_size=cache_size, ttl=cache_ttl)
+        
+        # BM25 index over titles/tags/parameter types, fused with vector results (built lazily)
+        self.hybrid_search = hybrid_search
+        self.lexical_index = None
+        self._lexical_checked_at = 0.0
+        self._lexical_lock = threading.Lock()
+    
+    # --- connection management -----------------------------------------------------------
+    
+    def _open_collection(self):
+        """Create a fresh client and guarded collection without touching the current ones"""
         try:
-            self.client.heartbeat()
-            print("✅ Connected to ChromaDB server!")
+            client = create_chroma_client(self.backend, host=self.host, port=self.port, path=self.path)
+            client.heartbeat()
+            print(f"✅ Connected to ChromaDB ({self.backend} backend)!")
+            
+            # Get the existing collection (created by your setup script)
+            if self.embedding_function is not None:
+                collection = client.get_collection(
+                    name="n8n_workflows",
+                    embedding_function=self.embedding_function
+                )
+            else:
+                collection = client.get_collection(name="n8n_workflows")
+            count = collection.count()
+            print(f"✅ Connected to collection with {count} workflows")
         except Exception as e:
-            print(f"❌ Failed to connect to ChromaDB server: {e}")
+            self.breaker.record_failure()
+            print(f"❌ Failed to connect to ChromaDB: {e}")
             raise
+        self._last_heartbeat = time.time()
+        self.breaker.record_success()
+        return client, _GuardedCollection(self, collection)
+    
+    def connect(self):
+        """Connect to ChromaDB now instead of on first use"""
+        with self._connect_lock:
+            try:
+                if self._collection is None:
+                    self.client, self._collection = self._open_collection()
+            finally:
+                self._start_monitor()
+    
+    def _reconnect(self):
+        """Swap in a new connection; threads still holding the old collection finish on it"""
+        client, collection = self._open_collection()
+        with self._connect_lock:
+            self.client, self._collection = client, collection
+    
+    @property
+    def collection(self):
+        """Live collection, or the read-only snapshot while ChromaDB is unavailable"""
+        if self.breaker.allow_request():
+            try:
+                collection = self._collection
+                if collection is None:
+                    self.connect()
+                    collection = self._collection
+                return collection
+            except Exception:
+                pass
         
-        # Get the existing collection (created by your setup script)
+        snapshot = self._snapshot_collection()
+        if snapshot is not None:
+            return _ReadOnlyCollection(snapshot)
+        raise ChromaUnavailableError("ChromaDB is unavailable and no local snapshot exists")
+    
+    @collection.setter
+    def collection(self, collection):
+        with self._connect_lock:
+            self._collection = _GuardedCollection(self, collection)
+    
+    @property
+    def degraded(self) -> bool:
+        """True while requests are being served from the local snapshot"""
+        return self.breaker.state != "closed"
+    
+    def _start_monitor(self):
+        if self.heartbeat_interval and self._monitor_thread is None:
+            self._monitor_thread = threading.Thread(target=self._monitor, name="chroma-heartbeat", daemon=True)
+            self._monitor_thread.start()
+    
+    def _monitor(self):
+        """Background heartbeat: trips the breaker on failure, reconnects and refreshes the snapshot on recovery"""
+        self._maybe_refresh_snapshot()
+        while not self._stop_monitor.wait(self.heartbeat_interval):
+            try:
+                client = self.client or create_chroma_client(self.backend, host=self.host, port=self.port,
+                                                             path=self.path)
+                client.heartbeat()
+                self._last_heartbeat = time.time()
+                
+                if self._collection is None or self.breaker.state != "closed":
+                    # Recovering: build a new connection and swap it in
+                    self._reconnect()
+                else:
+                    self._maybe_refresh_snapshot()
+            except Exception as e:
+                self.breaker.record_failure()
+                print(f"⚠️ ChromaDB heartbeat failed ({self.breaker.state}): {e}")
+    
+    def close(self):
+        """Stop the background heartbeat"""
+        self._stop_monitor.set()
+    
+    def get_health(self) -> Dict:
+        """Connection health: breaker state, degraded mode and snapshot availability"""
+        snapshot = self._snapshot_collection()
+        return {
+            'backend': self.backend,
+            'connected': self._collection is not None,
+            'state': self.breaker.state,
+            'degraded': self.degraded,
+            'consecutive_failures': self.breaker.failures,
+            'last_heartbeat': self._last_heartbeat,
+            'snapshot_workflows': snapshot.count() if snapshot is not None else None
+        }
+    
+    # --- local snapshot ------------------------------------------------------------------
+    
+    def _snapshot_collection(self):
+        """Load the local snapshot collection if one has been written"""
+        if not self.snapshot_path or self.backend != "http":
+            return None
+        if self._snapshot is None:
+            if not os.path.exists(os.path.join(self.snapshot_path, "n8n_workflows.npz")):
+                return None
+            try:
+                from local_vector_index import LocalVectorClient
+                self._snapshot = LocalVectorClient(self.snapshot_path).get_collection(
+                    "n8n_workflows", embedding_function=self.embedding_function
+                )
+            except Exception as e:
+                print(f"⚠️ Could not load ChromaDB snapshot: {e}")
+                return None
+        return self._snapshot
+    
+    def _snapshot_marker_path(self) -> str:
+        return os.path.join(self.snapshot_path, "n8n_workflows.marker")
+    
+    def _live_marker(self, collection) -> str:
+        """Cheap change marker: live count plus the stamp of the last write made through this class"""
+        return f"{collection.count()}:{self._read_write_stamp()}"
+    
+    def _maybe_refresh_snapshot(self):
+        """Refresh the snapshot when it is missing, the server's count drifted or after a local write"""
+        collection = self._collection
+        if not self.snapshot_path or self.backend != "http" or collection is None:
+            return
         try:
-            self.collection = self.client.get_collection(name="n8n_workflows")
-            print(f"✅ Connected to collection with {self.collection.count()} workflows")
+            stored = None
+            if self._snapshot_collection() is not None and os.path.exists(self._snapshot_marker_path()):
+                with open(self._snapshot_marker_path(), 'r') as f:
+                    stored = f.read().strip()
+            if stored and stored == self._live_marker(collection._collection):
+                return
+            self.refresh_snapshot()
         except Exception as e:
-            print(f"❌ Failed to get collection: {e}")
-            raise
+            print(f"⚠️ Could not refresh ChromaDB snapshot: {e}")
     
-    def store_workflow(self, workflow_data: Dict[str, Any]):
+    def refresh_snapshot(self, page_size: int = 500) -> int:
+        """Copy the live collection (with embeddings) into the local read-only snapshot"""
+        from local_vector_index import LocalVectorClient
+        
+        live = self._collection._collection
+        # Read the stamp first so a write that lands during the copy triggers another refresh
+        write_stamp = self._read_write_stamp()
+        ids, documents, metadatas, embeddings = [], [], [], []
+        offset = 0
+        while True:
+            page = live.get(
+                limit=page_size, offset=offset, include=["metadatas", "documents", "embeddings"]
+            )
+            if not page['ids']:
+                break
+            ids.extend(page['ids'])
+            documents.extend(page['documents'] or [""] * len(page['ids']))
+            metadatas.extend(page['metadatas'] or [{}] * len(page['ids']))
+            embeddings.extend(page['embeddings'])
+            if len(page['ids']) < page_size:
+                break
+            offset += page_size
+        
+        snapshot = LocalVectorClient(self.snapshot_path).get_or_create_collection(
+            "n8n_workflows", embedding_function=self.embedding_function
+        )
+        snapshot.replace_all(ids, documents, metadatas, embeddings)
+        tmp_path = f"{self._snapshot_marker_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(f"{len(ids)}:{write_stamp}")
+        os.replace(tmp_path, self._snapshot_marker_path())
+        with self._connect_lock:
+            self._snapshot = snapshot
+        print(f"💾 ChromaDB snapshot refreshed ({len(ids)} workflows)")
+        return len(ids)
+    
+    def _prepare_workflow(self, workflow_data: Dict[str, Any]):
+        """Build (id, document, metadata) for a workflow without touching the server"""
+        # Random ids are collision-free across concurrent writers and need no collection scan
+        workflow_id = workflow_data.get("id") or f"generated_{uuid.uuid4().hex}"
+        document_text, metadata = build_workflow_document(workflow_data, workflow_id)
+        return workflow_id, document_text, metadata
+    
+    def store_workflow(self, workflow_data: Dict[str, Any]) -> str:
         """Store workflow metadata in ChromaDB"""
-        workflow_id = workflow_data.get("id", f"generated_{len(self.get_all_workflows()) + 1}")
-        title = workflow_data.get("title", "")
-        description = workflow_data.get("description", "")
-        domain = workflow_data.get("domain", "")
-        tags = workflow_data.get("tags", [])
-        parameter_types = workflow_data.get("parameter_types", [])
-        
-        # Create searchable document text
-        document_text = f"""
-        Title: {title}
-        Description: {description}
-        Domain: {domain}
-        Tags: {', '.join(tags) if isinstance(tags, list) else tags}
-        Parameters: {', '.join(parameter_types) if isinstance(parameter_types, list) else parameter_types}
-        """.strip()
-        
-        # Prepare metadata (convert lists to strings for ChromaDB compatibility)
-        metadata = {
-            'id': workflow_id,
-            'title': title,
-            'description': description,
-            'domain': domain,
-            'tags': ', '.join(tags) if isinstance(tags, list) else tags,
-            'parameter_types': ', '.join(parameter_types) if isinstance(parameter_types, list) else parameter_types
-        }
+        workflow_id, document_text, metadata = self._prepare_workflow(workflow_data)
+        previous = self._stored_domains([workflow_id])
         
-        # Add to collection
-        self.collection.add(
+        # Upsert so re-storing a workflow with the same id updates it in place
+        self.collection.upsert(
             ids=[workflow_id],
             documents=[document_text],
             metadatas=[metadata]
         )
         
-        print(f"✅ Stored workflow: {title} in domain: {domain}")
+        # Any cached search may now be missing the new workflow
+        self.query_cache.clear()
+        self._record_domains(previous, {workflow_id: metadata['domain']})
+        self._bump_write_stamp()
+        if self.lexical_index is not None:
+            self.lexical_index.add(workflow_id, metadata)
+        
+        print(f"✅ Stored workflow: {metadata['title']} in domain: {metadata['domain']}")
+        return workflow_id
     
-    def search_similar_workflows(self, query: str, domain: str = None, n_results: int = 3) -> List[Dict]:
-        """Search for similar workflows based on query"""
-        try:
-            # Prepare where filter if domain is specified
-            where_filter = {"domain": domain} if domain else None
-            
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                where=where_filter
-            )
+    def store_workflows(self, workflows: List[Dict[str, Any]], batch_size: int = 100) -> List[str]:
+        """Bulk upsert many workflows in batched requests"""
+        stored_ids = []
+        for start in range(0, len(workflows), batch_size):
+            prepared = [self._prepare_workflow(wf) for wf in workflows[start:start + batch_size]]
+            ids, documents, metadatas = (list(column) for column in zip(*prepared))
+            previous = self._stored_domains(ids)
+            self.collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+            self._record_domains(previous, {workflow_id: metadata['domain'] for workflow_id, metadata in zip(ids, metadatas)})
+            self._bump_write_stamp()
+            if self.lexical_index is not None:
+                for workflow_id, metadata in zip(ids, metadatas):
+                    self.lexical_index.add(workflow_id, metadata)
+            stored_ids.extend(ids)
+        
+        if stored_ids:
+            self.query_cache.clear()
+            print(f"✅ Stored {len(stored_ids)} workflows")
+        return stored_ids
+    
+    def _ensure_lexical_index(self, max_age: float = 30) -> BM25Index:
+        """Build the BM25 index on first use; rebuild if the collection changed elsewhere"""
+        with self._lexical_lock:
+            now = time.monotonic()
+            if self.lexical_index is not None and now - self._lexical_checked_at < max_age:
+                return self.lexical_index
             
+            if self.lexical_index is None or len(self.lexical_index) != self.collection.count():
+                index = BM25Index()
+                for workflow in self.iter_workflows(fields=("id", "domain") + LEXICAL_FIELDS, page_size=500):
+                    index.add(workflow['id'], workflow)
+                self.lexical_index = index
+            self._lexical_checked_at = now
+            return self.lexical_index
+    
+    def _vector_search_many(self, queries: List[str], domain: Optional[str], n_results: int,
+                            ids: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Dense similarity search for several queries in one request, optionally restricted to ids"""
+        filters = []
+        if domain:
+            filters.append({"domain": domain})
+        if ids is not None:
+            filters.append({"id": {"$in": list(ids)}})
+        where_filter = filters[0] if len(filters) == 1 else ({"$and": filters} if filters else None)
+        
+        results = self.collection.query(
+            query_texts=list(queries),
+            n_results=n_results,
+            where=where_filter
+        )
+        
+        grouped = []
+        for q in range(len(queries)):
             similar_workflows = []
-            if results['metadatas'] and results['metadatas'][0]:
-                for i, metadata in enumerate(results['metadatas'][0]):
+            if results['metadatas'] and q < len(results['metadatas']) and results['metadatas'][q]:
+                for i, metadata in enumerate(results['metadatas'][q]):
                     # Add similarity score
-                    similarity = 1 - results['distances'][0][i] if results['distances'] else 1.0
+                    similarity = 1 - results['distances'][q][i] if results['distances'] else 1.0
                     workflow_info = metadata.copy()
+                    workflow_info.setdefault('id', results['ids'][q][i])
                     workflow_info['similarity'] = similarity
                     similar_workflows.append(workflow_info)
+            grouped.append(similar_workflows)
+        return grouped
+    
+    def _vector_search(self, query: str, domain: Optional[str], n_results: int,
+                       ids: Optional[List[str]] = None) -> List[Dict]:
+        """Dense similarity search, optionally restricted to a candidate id set"""
+        return self._vector_search_many([query], domain, n_results, ids=ids)[0]
+    
+    @staticmethod
+    def _fuse(vector: List[Dict], lexical: List, n_results: int):
+        """RRF-fuse vector hits with (id, score) BM25 hits; returns (top ids, fused scores, lexical scores)"""
+        lexical_scores = dict(lexical)
+        fused = reciprocal_rank_fusion([
+            [workflow['id'] for workflow in vector],
+            [doc_id for doc_id, _ in lexical]
+        ])
+        # Ties (one rank apart in each list) go to the stronger lexical match
+        top_ids = sorted(fused, key=lambda doc_id: (fused[doc_id], lexical_scores.get(doc_id, 0.0)),
+                         reverse=True)[:n_results]
+        return top_ids, fused, lexical_scores
+    
+    @staticmethod
+    def _annotate(top_ids: List[str], by_id: Dict[str, Dict], fused: Dict[str, float],
+                  lexical_scores: Dict[str, float]) -> List[Dict]:
+        similar_workflows = []
+        for doc_id in top_ids:
+            if doc_id not in by_id:
+                continue
+            workflow_info = dict(by_id[doc_id])
+            workflow_info['lexical_score'] = lexical_scores.get(doc_id, 0.0)
+            workflow_info['fused_score'] = fused[doc_id]
+            similar_workflows.append(workflow_info)
+        return similar_workflows
+    
+    def _hybrid_search(self, query: str, domain: Optional[str], n_results: int) -> List[Dict]:
+        """Fuse BM25 and vector rankings with reciprocal rank fusion"""
+        index = self._ensure_lexical_index()
+        candidate_k = max(n_results * 4, 20)
+        lexical = index.search(query, limit=candidate_k, domain=domain)
+        
+        # Exact tag/parameter terms in the query: score vectors only among lexical candidates
+        exact = {
+            doc_id for doc_id in index.exact_matches(query)
+            if not domain or index.metadata[doc_id].get('domain') == domain
+        }
+        candidates = list(exact | {doc_id for doc_id, _ in lexical})
+        if exact and len(candidates) >= n_results:
+            vector = self._vector_search(query, domain, min(len(candidates), candidate_k), ids=candidates)
+        else:
+            vector = self._vector_search(query, domain, candidate_k)
+        
+        top_ids, fused, lexical_scores = self._fuse(vector, lexical, n_results)
+        by_id = {workflow['id']: workflow for workflow in vector}
+        missing = [doc_id for doc_id in top_ids if doc_id not in by_id]
+        if missing:
+            # Lexical-only hits still need metadata and a vector similarity
+            by_id.update({w['id']: w for w in self._vector_search(query, None, len(missing), ids=missing)})
+        
+        return self._annotate(top_ids, by_id, fused, lexical_scores)
+    
+    def search_similar_workflows(self, query: str, domain: str = None, n_results: int = 3,
+                                 hybrid: Optional[bool] = None) -> List[Dict]:
+        """Search for similar workflows based on query"""
+        hybrid = self.hybrid_search if hybrid is None else hybrid
+        cache_key = (normalize_query(query), domain, n_results, hybrid)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            # Callers may mutate results, so hand out copies
+            return copy.deepcopy(cached)
+        generation = self.query_cache.generation
+        
+        try:
+            if hybrid:
+                similar_workflows = self._hybrid_search(query, domain, n_results)
+            else:
+                similar_workflows = self._vector_search(query, domain, n_results)
             
+            self.query_cache.set(cache_key, copy.deepcopy(similar_workflows), generation)
             return similar_workflows
             
         except Exception as e:
             print(f"❌ Error searching workflows: {e}")
             return []
     
-    def get_all_workflows_by_domain(self, domain: str) -> List[Dict]:
-        """Get all workflows for a specific domain"""
+    def search_many(self, queries: List[str], domain: str = None, n_results: int = 3,
+                    hybrid: Optional[bool] = None) -> List[List[Dict]]:
+        """Search several queries in one round trip; returns one result list per query, in order
+        
+        Cached queries are answered locally and the rest share a single collection.query call.
+        In hybrid mode the BM25 side runs in-process, so no per-query prefilter requests are made.
+        """
+        hybrid = self.hybrid_search if hybrid is None else hybrid
+        results: List[Optional[List[Dict]]] = [None] * len(queries)
+        keys = [(normalize_query(query), domain, n_results, hybrid) for query in queries]
+        
+        pending = {}
+        for i, key in enumerate(keys):
+            cached = self.query_cache.get(key)
+            if cached is not None:
+                results[i] = copy.deepcopy(cached)
+            else:
+                # Duplicate queries in one batch are sent once
+                pending.setdefault(key, []).append(i)
+        if not pending:
+            return results
+        generation = self.query_cache.generation
+        
         try:
-            results = self.collection.get(
-                where={"domain": domain}
-            )
+            batch = [queries[positions[0]] for positions in pending.values()]
+            candidate_k = max(n_results * 4, 20) if hybrid else n_results
+            vector_groups = self._vector_search_many(batch, domain, candidate_k)
             
-            workflows = []
-            if results['metadatas']:
-                workflows = results['metadatas']
+            if hybrid:
+                index = self._ensure_lexical_index()
+                lexical_groups = [index.search(query, limit=candidate_k, domain=domain) for query in batch]
+                fused_groups = [self._fuse(vector, lexical, n_results)
+                                for vector, lexical in zip(vector_groups, lexical_groups)]
+                
+                # Lexical-only hits need metadata and a vector similarity, exactly as in a single
+                # search: one query for all texts, restricted to the union of those ids
+                own_hits = [{w['id']: w for w in vector} for vector in vector_groups]
+                missing = sorted({
+                    doc_id
+                    for hits, (top_ids, _, _) in zip(own_hits, fused_groups)
+                    for doc_id in top_ids if doc_id not in hits
+                })
+                restricted = [{} for _ in batch]
+                if missing:
+                    restricted = [
+                        {w['id']: w for w in group}
+                        for group in self._vector_search_many(batch, None, len(missing), ids=missing)
+                    ]
+                
+                groups = []
+                for hits, fetched, (top_ids, fused, lexical_scores) in zip(own_hits, restricted, fused_groups):
+                    groups.append(self._annotate(top_ids, {**fetched, **hits}, fused, lexical_scores))
+            else:
+                groups = vector_groups
             
-            return workflows
+            for (key, positions), group in zip(pending.items(), groups):
+                self.query_cache.set(key, copy.deepcopy(group), generation)
+                for i in positions:
+                    results[i] = copy.deepcopy(group)
+            return results
             
+        except Exception as e:
+            print(f"❌ Error in batched workflow search: {e}")
+            return [result if result is not None else [] for result in results]
+    
+    def iter_workflow_pages(self, domain: Optional[str] = None, page_size: int = 100, offset: int = 0,
+                            limit: Optional[int] = None, fields: Optional[Iterable[str]] = None,
+                            include: Iterable[str] = ("metadatas",)) -> Iterator[List[Dict]]:
+        """Lazily yield pages of workflow records using limit/offset paging
+        
+        fields projects each record's metadata (e.g. ("id", "title")). include controls what the
+        server sends: metadatas only by default; add "documents" or "embeddings" to get them
+        attached as 'document' / 'embedding'.
+        """
+        fields = tuple(fields) if fields else None
+        include = list(include)
+        where = {"domain": domain} if domain else None
+        remaining = limit
+        
+        while remaining is None or remaining > 0:
+            size = page_size if remaining is None else min(page_size, remaining)
+            results = self.collection.get(where=where, limit=size, offset=offset, include=include)
+            ids = results['ids'] or []
+            if not ids:
+                return
+            
+            metadatas = results.get('metadatas') or [None] * len(ids)
+            documents = results.get('documents') if "documents" in include else None
+            embeddings = results.get('embeddings') if "embeddings" in include else None
+            
+            page = []
+            for i, workflow_id in enumerate(ids):
+                metadata = metadatas[i] or {}
+                record = {key: metadata[key] for key in fields if key in metadata} if fields else dict(metadata)
+                if fields is None or "id" in fields:
+                    record.setdefault('id', workflow_id)
+                if documents is not None:
+                    record['document'] = documents[i]
+                if embeddings is not None:
+                    record['embedding'] = embeddings[i]
+                page.append(record)
+            yield page
+            
+            if len(ids) < size:
+                return
+            offset += len(ids)
+            if remaining is not None:
+                remaining -= len(ids)
+    
+    def iter_workflows(self, domain: Optional[str] = None, page_size: int = 100, offset: int = 0,
+                       limit: Optional[int] = None, fields: Optional[Iterable[str]] = None,
+                       include: Iterable[str] = ("metadatas",)) -> Iterator[Dict]:
+        """Lazily yield workflow records one at a time (see iter_workflow_pages)"""
+        for page in self.iter_workflow_pages(domain, page_size, offset, limit, fields, include):
+            yield from page
+    
+    def get_all_workflows_by_domain(self, domain: str, fields: Optional[Iterable[str]] = None) -> List[Dict]:
+        """Get all workflows for a specific domain"""
+        try:
+            return list(self.iter_workflows(domain=domain, fields=fields))
         except Exception as e:
             print(f"❌ Error getting workflows by domain: {e}")
             return []
     
-    def get_all_workflows(self) -> List[Dict]:
+    def get_all_workflows(self, fields: Optional[Iterable[str]] = None) -> List[Dict]:
         """Get all workflows"""
         try:
-            results = self.collection.get()
-            return results['metadatas'] if results['metadatas'] else []
+            return list(self.iter_workflows(fields=fields))
         except Exception as e:
             print(f"❌ Error getting all workflows: {e}")
             return []
     
+    def get_cache_stats(self) -> Dict:
+        """Get search result cache hit/miss counters"""
+        return self.query_cache.stats()
+    
+    def get_embedding_cache_stats(self) -> Dict:
+        """Get on-disk embedding cache counters (empty if no cache is configured)"""
+        if isinstance(self.embedding_function, CachedEmbeddingFunction):
+            return self.embedding_function.stats()
+        return {}
+    
+    def clear_cache(self):
+        """Invalidate all cached search results"""
+        self.query_cache.clear()
+    
     def get_workflow_by_id(self, workflow_id: str) -> Dict:
         """Get specific workflow by ID"""
         try:
@@ -126,17 +752,158 @@ class WorkflowChromaDB:
             print(f"❌ Error getting workflow by ID: {e}")
             return {}
     
-    def get_collection_stats(self) -> Dict:
+    @contextlib.contextmanager
+    def _stats_file_lock(self):
+        """Cross-process lock around the sidecar read-modify-write"""
+        with open(f"{self.stats_path}.lock", 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            elif msvcrt is not None:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+    
+    def _read_stats_file(self) -> Dict[str, Any]:
+        if not os.path.exists(self.stats_path):
+            return {}
+        with open(self.stats_path, 'r') as f:
+            return json.load(f)
+    
+    def _load_domain_counts(self) -> Optional[Dict[str, int]]:
+        """Load persisted per-domain counters for this collection from the sidecar file"""
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return None
+        try:
+            return self._read_stats_file().get(self.stats_key)
+        except (OSError, json.JSONDecodeError):
+            return None
+    
+    def _save_domain_counts(self, domain_counts: Dict[str, int], deltas: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """Atomically persist per-domain counters to the sidecar file
+        
+        With `deltas`, they are applied to the counters currently on disk (under a file lock), so
+        concurrent writers in other processes don't overwrite each other's increments.
+        Returns the counters that were written.
+        """
+        if not self.stats_path:
+            return self._apply_deltas(domain_counts, deltas) if deltas else domain_counts
+        try:
+            with self._stats_file_lock():
+                data = self._read_stats_file()
+                if deltas:
+                    domain_counts = self._apply_deltas(data.get(self.stats_key) or domain_counts, deltas)
+                data[self.stats_key] = domain_counts
+                tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.stats_path)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Could not persist collection stats: {e}")
+            if deltas:
+                domain_counts = self._apply_deltas(domain_counts, deltas)
+        return domain_counts
+    
+    def _read_write_stamp(self) -> float:
+        """Time of the last write through WorkflowChromaDB, from any process sharing the sidecar"""
+        stamp = self._write_stamp
+        if self.stats_path:
+            try:
+                stamp = max(stamp, self._read_stats_file().get("write_stamps", {}).get(self.stats_key, 0.0))
+            except (OSError, json.JSONDecodeError):
+                pass
+        return stamp
+    
+    def _bump_write_stamp(self):
+        """Record a write so the health monitor refreshes the snapshot even if the count didn't change"""
+        self._write_stamp = time.time()
+        if not self.stats_path:
+            return
+        try:
+            with self._stats_file_lock():
+                data = self._read_stats_file()
+                data.setdefault("write_stamps", {})[self.stats_key] = self._write_stamp
+                tmp_path = f"{self.stats_path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.stats_path)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Could not persist write stamp: {e}")
+    
+    @staticmethod
+    def _apply_deltas(domain_counts: Dict[str, int], deltas: Dict[str, int]) -> Dict[str, int]:
+        counts = dict(domain_counts)
+        for domain, delta in deltas.items():
+            counts[domain] = counts.get(domain, 0) + delta
+            if counts[domain] <= 0:
+                del counts[domain]
+        return counts
+    
+    def _scan_domain_counts(self, page_size: int = 500) -> Dict[str, int]:
+        """Rebuild per-domain counters with paged, metadata-only reads"""
+        domain_counts = {}
+        for workflow in self.iter_workflows(page_size=page_size, fields=("domain",)):
+            domain = workflow.get('domain', 'Unknown')
+            domain_counts[domain] = domain_counts.get(domain, 0) + 1
+        return domain_counts
+    
+    def _stored_domains(self, ids: List[str]) -> Optional[Dict[str, str]]:
+        """Current domain of the ids that already exist, or None when counters aren't being kept"""
+        if self._domain_counts is None:
+            return None
+        try:
+            existing = self.collection.get(ids=list(dict.fromkeys(ids)), include=["metadatas"])
+        except Exception as e:
+            print(f"⚠️ Could not read existing workflows for stats: {e}")
+            return None
+        return {
+            workflow_id: (metadata or {}).get('domain') or 'Unknown'
+            for workflow_id, metadata in zip(existing.get('ids') or [], existing.get('metadatas') or [])
+        }
+    
+    def _record_domains(self, previous: Optional[Dict[str, str]], written: Dict[str, str]):
+        """Adjust counters for new ids and for ids whose domain changed; in-place updates don't count"""
+        if previous is None:
+            # Existing ids unknown: drop the counters so the next stats call rescans
+            with self._stats_lock:
+                self._domain_counts = None
+            return
+        deltas: Dict[str, int] = {}
+        for workflow_id, domain in written.items():
+            domain = domain or 'Unknown'
+            old_domain = previous.get(workflow_id)
+            if old_domain == domain:
+                continue
+            if old_domain is not None:
+                deltas[old_domain] = deltas.get(old_domain, 0) - 1
+            deltas[domain] = deltas.get(domain, 0) + 1
+        with self._stats_lock:
+            if self._domain_counts is None or not deltas:
+                return
+            self._domain_counts = self._save_domain_counts(self._domain_counts, deltas)
+    
+    def get_collection_stats(self, refresh: bool = False) -> Dict:
         """Get collection statistics"""
         try:
             total_count = self.collection.count()
             
-            # Get domain distribution
-            all_workflows = self.get_all_workflows()
-            domain_counts = {}
-            for wf in all_workflows:
-                domain = wf.get('domain', 'Unknown')
-                domain_counts[domain] = domain_counts.get(domain, 0) + 1
+            with self._stats_lock:
+                if self._domain_counts is None and not refresh:
+                    self._domain_counts = self._load_domain_counts()
+                
+                # count() is cheap; only rescan when the counters disagree with it (updates in
+                # place, deletes or writes from another process)
+                if refresh or self._domain_counts is None or sum(self._domain_counts.values()) != total_count:
+                    self._domain_counts = self._scan_domain_counts()
+                    self._save_domain_counts(self._domain_counts)
+                
+                domain_counts = dict(self._domain_counts)
             
             return {
                 'total_workflows': total_count,
@@ -13,16 +13,62 @@ class Config:
     # Mistral AI Configuration
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
     MISTRAL_MODEL = os.getenv("MISTRAL_MODEL", "mistral-medium")
+    # Upper bound (seconds) for a single workflow generation call
+    MISTRAL_TIMEOUT = float(os.getenv("MISTRAL_TIMEOUT", "60"))
+    # Speculative generation: K concurrent calls, first valid workflow wins (0 disables it)
+    SPECULATIVE_GENERATIONS = int(os.getenv("SPECULATIVE_GENERATIONS", "0"))
+    SPECULATIVE_MODELS = [m.strip() for m in os.getenv("SPECULATIVE_MODELS", "").split(",") if m.strip()]
+    # Tiered routing: simple requests go to the pattern engine or a small model, complex ones to the large model
+    MODEL_ROUTING = os.getenv("MODEL_ROUTING", "false").lower() in ("1", "true", "yes")
+    ROUTER_SMALL_MODEL = os.getenv("ROUTER_SMALL_MODEL", "mistral-small-latest")
+    ROUTER_LARGE_MODEL = os.getenv("ROUTER_LARGE_MODEL", "mistral-large-latest")
+    ROUTER_PATTERN_THRESHOLD = float(os.getenv("ROUTER_PATTERN_THRESHOLD", "0.25"))
+    ROUTER_LARGE_THRESHOLD = float(os.getenv("ROUTER_LARGE_THRESHOLD", "0.55"))
     
     # n8n Configuration
     N8N_BASE_URL = os.getenv("N8N_BASE_URL")
     N8N_API_KEY = os.getenv("N8N_API_KEY")
+    N8N_POOL_SIZE = int(os.getenv("N8N_POOL_SIZE", "10"))
+    N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "30"))
+    N8N_MAX_RETRIES = int(os.getenv("N8N_MAX_RETRIES", "3"))
+    N8N_CONCURRENCY = int(os.getenv("N8N_CONCURRENCY", "10"))
     
-    # ChromaDB Configuration (Server mode)
+    # ChromaDB Configuration
+    # Backend: "http" (ChromaDB server), "persistent" (in-process ChromaDB) or "numpy" (in-process exact index)
+    CHROMA_BACKEND = os.getenv("CHROMA_BACKEND", "http")
+    CHROMA_PATH = os.getenv("CHROMA_PATH", "./chroma_data")
     CHROMA_HOST = os.getenv("CHROMA_HOST", "localhost")
     CHROMA_PORT = int(os.getenv("CHROMA_PORT", "8000"))
+    CHROMA_CACHE_SIZE = int(os.getenv("CHROMA_CACHE_SIZE", "256"))
+    CHROMA_CACHE_TTL = float(os.getenv("CHROMA_CACHE_TTL", "300"))
+    # On-disk query/document embedding cache shared by all processes (empty string disables it)
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", ".embedding_cache.sqlite3")
+    CHROMA_STATS_PATH = os.getenv("CHROMA_STATS_PATH", ".chroma_stats.json")
+    # Fuse BM25 over titles/tags/parameters with vector similarity
+    HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes")
+    # Local read-only copy served while the ChromaDB server is down (empty string disables it)
+    CHROMA_SNAPSHOT_PATH = os.getenv("CHROMA_SNAPSHOT_PATH", "./chroma_snapshot")
+    CHROMA_HEARTBEAT_INTERVAL = float(os.getenv("CHROMA_HEARTBEAT_INTERVAL", "30"))
+    CHROMA_FAILURE_THRESHOLD = int(os.getenv("CHROMA_FAILURE_THRESHOLD", "3"))
+    CHROMA_RESET_TIMEOUT = float(os.getenv("CHROMA_RESET_TIMEOUT", "30"))
+    
+    # Generated workflow cache (repeat descriptions skip the LLM call)
+    GENERATION_CACHE = os.getenv("GENERATION_CACHE", "true").lower() in ("1", "true", "yes")
+    GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", ".generation_cache.sqlite3")
+    GENERATION_CACHE_SIZE = int(os.getenv("GENERATION_CACHE_SIZE", "500"))
+    
+    # Retrieval-augmented few-shot: skeletons of the closest stored n8n exports are added to the prompt
+    FEW_SHOT_EXAMPLES = int(os.getenv("FEW_SHOT_EXAMPLES", "2"))
+    FEW_SHOT_MIN_SIMILARITY = float(os.getenv("FEW_SHOT_MIN_SIMILARITY", "0.3"))
+    WORKFLOW_LIBRARY_DIR = os.getenv("WORKFLOW_LIBRARY_DIR", ".")
+    WORKFLOW_SKELETONS_PATH = os.getenv("WORKFLOW_SKELETONS_PATH", ".workflow_skeletons.json")
+    # Template-first: above this similarity the closest stored workflow is adapted instead of generated
+    TEMPLATE_THRESHOLD = float(os.getenv("TEMPLATE_THRESHOLD", "0.8"))
+    TEMPLATE_LLM_EDIT = os.getenv("TEMPLATE_LLM_EDIT", "true").lower() in ("1", "true", "yes")
     
     # Workflow Configuration
+    # Node types and pattern library (empty string uses the bundled workflow_registry.json)
+    WORKFLOW_REGISTRY_PATH = os.getenv("WORKFLOW_REGISTRY_PATH", "")
     DEFAULT_DOMAINS = ["HR", "Marketing", "CRM", "Sales", "IT"]
     
     @classmethod
@@ -46,7 +92,10 @@ class Config:
         print(f"✅ Mistral API Key: {'*' * 20}...{cls.MISTRAL_API_KEY[-4:] if cls.MISTRAL_API_KEY else 'NOT SET'}")
         print(f"✅ n8n URL: {cls.N8N_BASE_URL}")
         print(f"✅ n8n API Key: {'*' * 20}...{cls.N8N_API_KEY[-4:] if cls.N8N_API_KEY else 'NOT SET'}")
-        print(f"✅ ChromaDB: {cls.CHROMA_HOST}:{cls.CHROMA_PORT}")
+        if cls.CHROMA_BACKEND == "http":
+            print(f"✅ ChromaDB: {cls.CHROMA_HOST}:{cls.CHROMA_PORT}")
+        else:
+            print(f"✅ ChromaDB: {cls.CHROMA_BACKEND} backend at {cls.CHROMA_PATH}")
         
         return True
 
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DEFAULT_CACHE_PATH = ".embedding_cache.sqlite3"
+# Model behind chromadb's DefaultEmbeddingFunction
+DEFAULT_MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+def embedding_model_name(embedding_function: Callable) -> str:
+    """Cache namespace for an embedding function: its model_name, else its qualified class/function name"""
+    name = getattr(embedding_function, "model_name", None) or getattr(embedding_function, "_model_name", None)
+    if isinstance(name, str) and name:
+        return name
+    # Plain functions carry their own __qualname__; instances fall back to their class
+    target = embedding_function if hasattr(embedding_function, "__qualname__") else type(embedding_function)
+    return f"{target.__module__}.{target.__qualname__}"
+
+
+class CachedEmbeddingFunction:
+    def __init__(self, embedding_function: Optional[Callable] = None, path: str = DEFAULT_CACHE_PATH,
+                 model_name: Optional[str] = None):
+        """ChromaDB embedding function that memoizes vectors in an on-disk SQLite cache
+
+        Vectors are keyed by a hash of model name + text, so repeated queries and re-ingestion of
+        unchanged documents skip model inference. Without an explicit model_name the key comes from
+        the wrapped function (its model_name attribute, else its class or function name), so two
+        models never share cache entries. The database runs in WAL mode, so any number of
+        processes (Streamlit workers, agents, setup_chroma) can read while one writes.
+        """
+        if embedding_function is None:
+            from chromadb.utils import embedding_functions
+            embedding_function = embedding_functions.DefaultEmbeddingFunction()
+            model_name = model_name or DEFAULT_MODEL_NAME
+
+        self.embedding_function = embedding_function
+        self.path = path
+        self.model_name = model_name or embedding_model_name(embedding_function)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, dim INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections can't be shared across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\x00{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, keys: Sequence[str]) -> Dict[str, List[float]]:
+        conn = self._connection()
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = array("f", blob).tolist()
+        return found
+
+    def _store(self, items: Dict[str, Sequence[float]]):
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR IGNORE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+            [(key, len(vector), array("f", vector).tobytes()) for key, vector in items.items()]
+        )
+        conn.commit()
+
+    def __call__(self, input: Sequence[str]) -> List[List[float]]:
+        """Embed texts, running the model only for texts not already cached"""
+        texts = list(input)
+        keys = [self._key(text) for text in texts]
+        cached = self._lookup(list(set(keys)))
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached:
+                missing.setdefault(key, text)
+
+        if missing:
+            vectors = self.embedding_function(list(missing.values()))
+            # Round-trip through float32 so fresh and cached vectors are bit-identical
+            computed = {key: array("f", vector).tolist() for key, vector in zip(missing.keys(), vectors)}
+            self._store(computed)
+            cached.update(computed)
+
+        with self._lock:
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+
+        return [cached[key] for key in keys]
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "path": self.path
+            }
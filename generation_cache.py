@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = ".generation_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 500
+
+
+def normalize_description(description: str) -> str:
+    """Normalize a workflow description so trivially different phrasings share a cache key"""
+    return " ".join(description.lower().split()).rstrip(" .!?")
+
+
+class GenerationCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES):
+        """Content-addressed on-disk cache of generated workflow JSON with LRU eviction
+
+        Entries are keyed by normalized description + model + temperature + registry version + the
+        retrieved few-shot examples, so a changed node registry, model setting or library never
+        serves a stale workflow. Like the embedding
+        cache it is a WAL-mode SQLite file that several processes can share.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, workflow TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite connections can't be shared across threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(description: str, model: str, temperature: float, registry_version: str,
+                 examples: Optional[List[str]] = None) -> str:
+        """Key for one generation; examples are the few-shot skeletons the prompt was built with"""
+        examples_hash = hashlib.sha256("\x00".join(examples or []).encode("utf-8")).hexdigest()
+        canonical = json.dumps([normalize_description(description), model, round(temperature, 4), registry_version,
+                                examples_hash])
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Cached workflow for a key (marks it most recently used), or None"""
+        conn = self._connection()
+        row = conn.execute("SELECT workflow FROM generations WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+        conn.commit()
+        return json.loads(row[0])
+
+    def set(self, key: str, workflow: Dict[str, Any]):
+        """Store a workflow and evict least recently used entries beyond max_entries"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO generations (key, workflow, created_at, last_used) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(workflow, ensure_ascii=False), now, now)
+        )
+        conn.execute(
+            "DELETE FROM generations WHERE key IN ("
+            "SELECT key FROM generations ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        conn.commit()
+
+    def clear(self):
+        conn = self._connection()
+        conn.execute("DELETE FROM generations")
+        conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process plus the current number of entries"""
+        entries = self._connection().execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "path": self.path
+            }
@@ -0,0 +1,136 @@
+import math
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+
+# Fields indexed lexically; these hold the exact terms users type (tool names, parameters)
+LEXICAL_FIELDS = ("title", "tags", "parameter_types")
+
+STOPWORDS = frozenset({
+    "a", "an", "and", "the", "for", "to", "of", "in", "on", "with", "my", "me", "i", "we",
+    "is", "are", "be", "that", "this", "it", "by", "or", "from", "at", "as", "workflow",
+    "workflows", "create", "build", "make", "help", "please", "want", "need", "agent"
+})
+
+RRF_K = 60
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords"""
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in STOPWORDS]
+
+
+def detect_domain(query: str, domains: Iterable[str]) -> Optional[str]:
+    """Return the first domain named as a whole word in the query ("IT" no longer matches "submit")"""
+    words = set(_TOKEN_RE.findall(query.lower()))
+    for domain in domains:
+        if domain.lower() in words:
+            return domain
+    return None
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = RRF_K) -> Dict[str, float]:
+    """Fuse ranked id lists: score(d) = sum over lists of 1 / (k + rank)"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return dict(scores)
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Incremental BM25 inverted index over workflow titles, tags and parameter types"""
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.doc_lengths: Dict[str, int] = {}
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+        self.phrases: Dict[str, set] = defaultdict(set)
+        self.doc_terms: Dict[str, Tuple[set, set]] = {}
+        self.max_phrase_words = 1
+        self.total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    @staticmethod
+    def _field_text(metadata: Dict[str, Any], field: str) -> str:
+        value = metadata.get(field, "")
+        return ", ".join(value) if isinstance(value, list) else str(value or "")
+
+    def add(self, doc_id: str, metadata: Dict[str, Any]):
+        """Index (or re-index) one workflow"""
+        with self._lock:
+            self.remove(doc_id)
+            tokens = []
+            doc_phrases = set()
+            for field in LEXICAL_FIELDS:
+                text = self._field_text(metadata, field)
+                tokens.extend(tokenize(text))
+                # Whole tags / parameter names, used to detect exact-term queries
+                if field != "title":
+                    for phrase in text.split(","):
+                        phrase = " ".join(_TOKEN_RE.findall(phrase.lower()))
+                        if phrase:
+                            self.phrases[phrase].add(doc_id)
+                            doc_phrases.add(phrase)
+                            self.max_phrase_words = max(self.max_phrase_words, phrase.count(" ") + 1)
+
+            for token in tokens:
+                self.postings[token][doc_id] = self.postings[token].get(doc_id, 0) + 1
+            self.doc_lengths[doc_id] = len(tokens)
+            self.total_length += len(tokens)
+            self.metadata[doc_id] = dict(metadata)
+            self.doc_terms[doc_id] = (set(tokens), doc_phrases)
+
+    def remove(self, doc_id: str):
+        with self._lock:
+            if doc_id not in self.doc_lengths:
+                return
+            terms, doc_phrases = self.doc_terms.pop(doc_id)
+            for token in terms:
+                self.postings[token].pop(doc_id, None)
+                if not self.postings[token]:
+                    del self.postings[token]
+            for phrase in doc_phrases:
+                self.phrases[phrase].discard(doc_id)
+                if not self.phrases[phrase]:
+                    del self.phrases[phrase]
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            self.metadata.pop(doc_id, None)
+
+    def exact_matches(self, query: str) -> set:
+        """Ids of workflows having a whole tag or parameter type that appears verbatim in the query"""
+        words = _TOKEN_RE.findall(query.lower())
+        with self._lock:
+            matched = set()
+            # Look up every query n-gram up to the longest indexed phrase
+            for n in range(1, min(self.max_phrase_words, len(words)) + 1):
+                for i in range(len(words) - n + 1):
+                    matched |= self.phrases.get(" ".join(words[i:i + n]), set())
+            return matched
+
+    def search(self, query: str, limit: int = 10, domain: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Top `limit` (id, BM25 score) pairs, touching only postings of the query terms"""
+        with self._lock:
+            n_docs = len(self.doc_lengths)
+            if n_docs == 0:
+                return []
+            avg_length = self.total_length / n_docs or 1.0
+            scores = defaultdict(float)
+            for token in set(tokenize(query)):
+                postings = self.postings.get(token)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    if domain and self.metadata[doc_id].get("domain") != domain:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
@@ -0,0 +1,173 @@
+import re
+import time
+from functools import lru_cache
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Keyword groups used by the pattern engine (workflow_generator) and the agent's custom workflows.
+# Keywords match whole words plus the inflections their word class allows ("approve" -> "approved")
+# and the derived forms listed in EXTRA_FORMS ("approval", "submitted", "conditional").
+KEYWORD_GROUPS = {
+    # Pattern engine (EnhancedN8nWorkflowGenerator._analyze_description)
+    "triggers": ["form", "webhook", "schedule", "manual", "email"],
+    "actions": ["email", "slack", "api", "database", "crm"],
+    "logic": ["if", "condition", "approve", "route", "check"],
+    "integrations": ["hubspot", "salesforce", "sheets", "slack"],
+    "data": ["process", "transform", "validate", "score"],
+    # Custom workflow components (WorkflowGeneratorAgent._generate_custom_workflow)
+    "inputs": ["form", "submit", "receive", "trigger", "webhook"],
+    "notifications": ["email", "notify", "send", "notification"],
+    "apis": ["api", "integration", "connect", "http"],
+    "conditions": ["if", "condition", "check", "approve", "decide"],
+    "processing": ["process", "transform", "calculate", "filter"],
+    "storage": ["database", "save", "store", "record"],
+    "chat": ["slack", "chat", "message", "team"]
+}
+
+PATTERN_GROUPS = ("triggers", "actions", "logic", "integrations", "data")
+FEATURE_GROUPS = tuple(KEYWORD_GROUPS)
+
+
+# Keywords that take verb endings (-s, -ed, -ing); all others only take a plural -s/-es
+VERBS = frozenset(["schedule", "email", "approve", "route", "check", "process", "transform", "validate",
+                   "score", "submit", "receive", "trigger", "notify", "send", "connect", "decide", "calculate",
+                   "filter", "save", "store", "record", "chat", "message"])
+# Keywords that only match as written
+UNINFLECTED = frozenset(["if", "http", "slack", "hubspot", "salesforce"])
+# Irregular and derived forms, listed per keyword instead of generic suffixes so "formal",
+# "stories" or "https" never count as "form", "store" or "http"
+EXTRA_FORMS = {
+    "manual": ["manually"],
+    "condition": ["conditional", "conditionally"],
+    "approve": ["approval", "approvals"],
+    "submit": ["submitted", "submitting", "submission", "submissions"],
+    "chat": ["chatted", "chatting"],
+    "validate": ["validation", "validations"],
+    "calculate": ["calculation", "calculations"],
+    "transform": ["transformation", "transformations"],
+    "connect": ["connection", "connections"],
+    "decide": ["decision", "decisions"],
+    "store": ["storage"],
+    "sheets": ["sheet"]
+}
+
+
+def _plural(word: str) -> str:
+    return word + "es" if word.endswith(("s", "x", "ch", "sh")) else word + "s"
+
+
+def _inflections(keyword: str) -> set:
+    """Surface forms of a keyword: its word-class endings plus its listed derived forms"""
+    forms = {keyword, *EXTRA_FORMS.get(keyword, [])}
+    if keyword in UNINFLECTED:
+        return forms
+    if keyword not in VERBS:
+        return forms | {_plural(keyword)}
+    if keyword.endswith("e"):
+        return forms | {keyword + "s", keyword + "d", keyword[:-1] + "ing"}
+    if keyword.endswith("y"):
+        return forms | {keyword[:-1] + "ies", keyword[:-1] + "ied", keyword + "ing"}
+    return forms | {_plural(keyword), keyword + "ed", keyword + "ing"}
+
+
+def _build_index() -> Dict[str, Tuple[Tuple[str, int], ...]]:
+    """Surface form -> (group, position in group) for every group the keyword belongs to"""
+    slots: Dict[str, List[Tuple[str, int]]] = {}
+    for group, keywords in KEYWORD_GROUPS.items():
+        for position, keyword in enumerate(keywords):
+            slots.setdefault(keyword, []).append((group, position))
+
+    index: Dict[str, Tuple[Tuple[str, int], ...]] = {}
+    for keyword, keyword_slots in slots.items():
+        for form in _inflections(keyword):
+            # An exact keyword always wins over another keyword's inflection
+            if form not in index or form == keyword:
+                index[form] = tuple(keyword_slots)
+    return index
+
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_FORMS = _build_index()
+_FORM_SET = frozenset(_FORMS)
+_SLOT_KEYWORDS = {slot: KEYWORD_GROUPS[slot[0]][slot[1]] for slots in _FORMS.values() for slot in slots}
+
+
+@lru_cache(maxsize=1024)
+def _description_slots(description: str) -> Tuple[Tuple[str, int], ...]:
+    """Sorted keyword slots of a description; memoized because the router, the pattern engine and
+    the agent all analyze the same description during one request"""
+    forms = _FORM_SET.intersection(_TOKEN_RE.findall(description.lower()))
+    return tuple(sorted(set(chain.from_iterable(map(_FORMS.__getitem__, forms)))))
+
+
+def analyze_keywords(description: str) -> Dict[str, List[str]]:
+    """Feature vector of a description: for every keyword group, the keywords it mentions (in group order)"""
+    features = {group: [] for group in FEATURE_GROUPS}
+    for slot in _description_slots(description):
+        features[slot[0]].append(_SLOT_KEYWORDS[slot])
+    return features
+
+
+def select_groups(features: Dict[str, List[str]], groups: Iterable[str]) -> Dict[str, List[str]]:
+    return {group: features[group] for group in groups}
+
+
+def feature_counts(features: Dict[str, List[str]]) -> List[int]:
+    """Numeric form of the feature vector, one count per group in FEATURE_GROUPS order"""
+    return [len(features[group]) for group in FEATURE_GROUPS]
+
+
+def _substring_scan(description: str) -> Dict[str, List[str]]:
+    """The previous approach (one substring scan per group), kept only for the benchmark"""
+    desc_lower = description.lower()
+    return {group: [word for word in keywords if word in desc_lower] for group, keywords in KEYWORD_GROUPS.items()}
+
+
+def benchmark(descriptions: Optional[List[str]] = None, rounds: int = 2000,
+              analyses_per_request: int = 3) -> Dict[str, float]:
+    """Per-description cost (microseconds) of analyze_keywords versus the substring scans
+
+    "cold" clears the memo before every description; "request" is the cost of the
+    `analyses_per_request` analyses one request makes (router, pattern engine, agent).
+    """
+    descriptions = descriptions or [
+        "Send a Slack message when a new form is submitted",
+        "If the lead score is high, update HubSpot and notify the sales team by email",
+        "Create an approval workflow for expense reports with manager check and database record",
+        "Every Monday, transform the Google Sheets export and post a summary to the team chat",
+        "Receive webhook calls from our API, validate the payload, calculate totals and store them in Salesforce",
+        # Near misses that must not match: formal/former/formation (form), stories (store), https (http)
+        "Manually review the former formal stories fetched over https and share the formation summary"
+    ]
+
+    def cold(description: str):
+        _description_slots.cache_clear()
+        analyze_keywords(description)
+
+    def request(analyzer):
+        def run(description: str):
+            _description_slots.cache_clear()
+            for _ in range(analyses_per_request):
+                analyzer(description)
+        return run
+
+    results = {}
+    for label, analyzer in (("compiled_us", cold), ("substring_us", _substring_scan),
+                            ("compiled_request_us", request(analyze_keywords)),
+                            ("substring_request_us", request(_substring_scan))):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for description in descriptions:
+                analyzer(description)
+        results[label] = (time.perf_counter() - start) / (rounds * len(descriptions)) * 1e6
+    return results
+
+
+if __name__ == "__main__":
+    print("⏱️ Keyword analyzer micro-benchmark")
+    stats = benchmark()
+    print(f"✅ Compiled matcher: {stats['compiled_us']:.2f} µs per description, "
+          f"{stats['compiled_request_us']:.2f} µs per request")
+    print(f"📊 Substring scans:  {stats['substring_us']:.2f} µs per description, "
+          f"{stats['substring_request_us']:.2f} µs per request")
+    print(f"🔍 'Notify the team' -> logic: {analyze_keywords('Notify the team')['logic']}")
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a ChromaDB-style metadata filter ($and/$or, $eq/$ne/$in/$nin, plain equality)"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(_matches(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, sub) for sub in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LocalVectorCollection:
+    def __init__(self, name: str, path: str, embedding_function: Callable, metadata: Optional[Dict] = None):
+        """In-process, NumPy-backed exact cosine index with the subset of the ChromaDB collection API we use
+
+        Data lives in a single <path>/<name>.npz holding unit-normalized float32 vectors plus the
+        ids, metadatas and documents as JSON. Every write replaces the file atomically; readers in
+        other processes pick up changes on their next call.
+        """
+        self.name = name
+        self.metadata = metadata or {"hnsw:space": "cosine"}
+        self.embedding_function = embedding_function
+        self.index_path = os.path.join(path, f"{name}.npz")
+        self._lock = threading.RLock()
+        self._loaded_mtime = None
+
+        os.makedirs(path, exist_ok=True)
+        self.ids: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.documents: List[str] = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self._index: Dict[str, int] = {}
+        self._maybe_reload()
+
+    # --- persistence -----------------------------------------------------------------
+
+    def _maybe_reload(self):
+        """Reload from disk if another process saved a newer version"""
+        if not os.path.exists(self.index_path):
+            return
+        mtime = os.path.getmtime(self.index_path)
+        if mtime == self._loaded_mtime:
+            return
+        with np.load(self.index_path) as data:
+            self.embeddings = data["embeddings"].astype(np.float32)
+            records = json.loads(data["records"].tobytes().decode('utf-8'))
+        self.ids = records["ids"]
+        self.metadatas = records["metadatas"]
+        self.documents = records["documents"]
+        self.metadata = records.get("metadata", self.metadata)
+        self._index = {workflow_id: i for i, workflow_id in enumerate(self.ids)}
+        self._loaded_mtime = mtime
+
+    def _save(self):
+        records = json.dumps({
+            "ids": self.ids,
+            "metadatas": self.metadatas,
+            "documents": self.documents,
+            "metadata": self.metadata
+        }, ensure_ascii=False).encode('utf-8')
+        # np.savez appends .npz unless the name already ends with it
+        tmp_path = f"{self.index_path[:-4]}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, embeddings=self.embeddings, records=np.frombuffer(records, dtype=np.uint8))
+        os.replace(tmp_path, self.index_path)
+        self._loaded_mtime = os.path.getmtime(self.index_path)
+
+    # --- helpers ---------------------------------------------------------------------------
+
+    @staticmethod
+    def _normalize(vectors) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _positions(self, ids: Optional[Sequence[str]], where: Optional[Dict[str, Any]]) -> List[int]:
+        if ids is not None:
+            positions = [self._index[i] for i in ids if i in self._index]
+        else:
+            positions = range(len(self.ids))
+        return [p for p in positions if _matches(self.metadatas[p], where)]
+
+    # --- ChromaDB collection API --------------------------------------------------------
+
+    def count(self) -> int:
+        with self._lock:
+            self._maybe_reload()
+            return len(self.ids)
+
+    def upsert(self, ids: Sequence[str], documents: Optional[Sequence[str]] = None,
+               metadatas: Optional[Sequence[Dict[str, Any]]] = None, embeddings=None):
+        ids = list(ids)
+        if embeddings is None:
+            embeddings = self.embedding_function(list(documents))
+        vectors = self._normalize(embeddings)
+        documents = list(documents) if documents is not None else [""] * len(ids)
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in ids]
+
+        with self._lock:
+            self._maybe_reload()
+            if self.embeddings.size == 0:
+                self.embeddings = np.zeros((0, vectors.shape[1]), dtype=np.float32)
+
+            existing_rows = self.embeddings.shape[0]
+            new_rows = []
+            for workflow_id, document, metadata, vector in zip(ids, documents, metadatas, vectors):
+                position = self._index.get(workflow_id)
+                if position is None:
+                    self._index[workflow_id] = len(self.ids)
+                    self.ids.append(workflow_id)
+                    self.documents.append(document)
+                    self.metadatas.append(metadata)
+                    new_rows.append(vector)
+                    continue
+                self.documents[position] = document
+                self.metadatas[position] = metadata
+                if position < existing_rows:
+                    self.embeddings[position] = vector
+                else:
+                    # Same id repeated within this batch
+                    new_rows[position - existing_rows] = vector
+            if new_rows:
+                self.embeddings = np.vstack([self.embeddings, np.stack(new_rows)])
+            self._save()
+
+    add = upsert
+
+    def replace_all(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+                    embeddings) -> None:
+        """Replace the whole collection with precomputed embeddings in a single save (used for snapshots)"""
+        vectors = self._normalize(embeddings) if len(ids) else np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self.ids = list(ids)
+            self.documents = list(documents)
+            self.metadatas = [dict(metadata or {}) for metadata in metadatas]
+            self.embeddings = vectors
+            self._index = {workflow_id: i for i, workflow_id in enumerate(self.ids)}
+            self._save()
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self._maybe_reload()
+            doomed = set(self._positions(ids, where))
+            if not doomed:
+                return
+            keep = [i for i in range(len(self.ids)) if i not in doomed]
+            self.ids = [self.ids[i] for i in keep]
+            self.documents = [self.documents[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+            self.embeddings = self.embeddings[keep] if keep else self.embeddings[:0]
+            self._index = {workflow_id: i for i, workflow_id in enumerate(self.ids)}
+            self._save()
+
+    def get(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict[str, Any]] = None,
+            limit: Optional[int] = None, offset: Optional[int] = None,
+            include: Sequence[str] = ("metadatas", "documents")) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_reload()
+            positions = self._positions(ids, where)
+            start = offset or 0
+            positions = positions[start:start + limit] if limit is not None else positions[start:]
+            return {
+                "ids": [self.ids[p] for p in positions],
+                "metadatas": [dict(self.metadatas[p]) for p in positions] if "metadatas" in include else None,
+                "documents": [self.documents[p] for p in positions] if "documents" in include else None,
+                "embeddings": [self.embeddings[p].tolist() for p in positions] if "embeddings" in include else None
+            }
+
+    def query(self, query_texts: Optional[Sequence[str]] = None, query_embeddings=None, n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = ("metadatas", "documents", "distances")) -> Dict[str, Any]:
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(list(query_texts))
+        queries = self._normalize(query_embeddings)
+
+        with self._lock:
+            self._maybe_reload()
+            positions = np.asarray(self._positions(None, where), dtype=np.int64)
+            result = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+            if positions.size == 0:
+                for key in result:
+                    result[key] = [[] for _ in range(len(queries))]
+                return result
+
+            # Cosine distance on unit vectors, same convention as an hnsw:space=cosine collection
+            candidates = self.embeddings[positions]
+            scores = queries @ candidates.T
+            k = min(n_results, positions.size)
+            for row in scores:
+                top = np.argpartition(-row, k - 1)[:k] if k < row.size else np.arange(row.size)
+                top = top[np.argsort(-row[top])]
+                chosen = positions[top]
+                result["ids"].append([self.ids[p] for p in chosen])
+                result["metadatas"].append([dict(self.metadatas[p]) for p in chosen])
+                result["documents"].append([self.documents[p] for p in chosen])
+                result["distances"].append([float(1.0 - row[t]) for t in top])
+            return result
+
+
+class LocalVectorClient:
+    def __init__(self, path: str = "./vector_index"):
+        """Minimal ChromaDB-client lookalike serving LocalVectorCollection instances from disk"""
+        self.path = path
+        self._collections: Dict[str, LocalVectorCollection] = {}
+
+    def heartbeat(self) -> int:
+        return 1
+
+    def _default_embedding_function(self) -> Callable:
+        from chromadb.utils import embedding_functions
+        return embedding_functions.DefaultEmbeddingFunction()
+
+    def get_collection(self, name: str, embedding_function: Optional[Callable] = None) -> LocalVectorCollection:
+        if name not in self._collections:
+            if not os.path.exists(os.path.join(self.path, f"{name}.npz")):
+                raise ValueError(f"Collection {name} does not exist.")
+            self._collections[name] = LocalVectorCollection(
+                name, self.path, embedding_function or self._default_embedding_function()
+            )
+        return self._collections[name]
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None,
+                                 embedding_function: Optional[Callable] = None) -> LocalVectorCollection:
+        if name not in self._collections:
+            self._collections[name] = LocalVectorCollection(
+                name, self.path, embedding_function or self._default_embedding_function(), metadata
+            )
+        return self._collections[name]
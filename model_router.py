@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+TIER_PATTERN = "pattern"
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# Approximate USD per 1M (input, output) tokens, used only to estimate routing savings.
+# Update to current pricing as needed; unknown models are costed at zero.
+MODEL_COSTS = {
+    "mistral-small-latest": (0.2, 0.6),
+    "mistral-medium": (2.7, 8.1),
+    "mistral-medium-latest": (0.4, 2.0),
+    "mistral-large-latest": (2.0, 6.0)
+}
+
+# Weight of each signal in the complexity score (they sum to 1)
+KEYWORD_WEIGHT = 0.45
+LENGTH_WEIGHT = 0.35
+NOVELTY_WEIGHT = 0.2
+
+# Description length (in words) treated as maximally complex
+LENGTH_CEILING = 60
+
+
+class ModelRouter:
+    def __init__(self, small_model: str = "mistral-small-latest", large_model: str = "mistral-large-latest",
+                 pattern_threshold: float = 0.25, large_threshold: float = 0.55, chroma_client=None,
+                 history_size: int = 500):
+        """Route workflow generation by request complexity: pattern engine, small model or large model
+
+        The score mixes keyword features from _analyze_description, description length and how
+        novel the request is compared to its nearest ChromaDB neighbour. Every decision and its
+        outcome (latency, tokens, estimated cost) is kept for get_stats().
+        """
+        self.small_model = small_model
+        self.large_model = large_model
+        self.pattern_threshold = pattern_threshold
+        self.large_threshold = large_threshold
+        self.chroma_client = chroma_client
+        self.decisions = deque(maxlen=history_size)
+        self._lock = threading.Lock()
+
+    def _nearest_similarity(self, description: str, hits: Optional[List[Dict[str, Any]]] = None) -> Optional[float]:
+        """Similarity of the closest stored workflow, or None when ChromaDB can't answer
+
+        Callers that already searched ChromaDB for this description pass their hits to skip the query.
+        """
+        if hits is None:
+            if self.chroma_client is None:
+                return None
+            try:
+                hits = self.chroma_client.search_similar_workflows(description, n_results=3)
+            except Exception:
+                return None
+        # Hybrid results are in fused-rank order; the nearest neighbour is the most similar hit
+        return max(0.0, min(1.0, max(hit.get('similarity', 0.0) for hit in hits))) if hits else 0.0
+
+    def score(self, description: str, keywords: Dict[str, List[str]],
+              nearest_hits: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Complexity score in [0, 1] plus the features it was computed from"""
+        groups_hit = sum(1 for words in keywords.values() if words)
+        keyword_hits = sum(len(words) for words in keywords.values())
+        # Branching and third-party integrations are what make generated workflows hard
+        keyword_score = min(1.0, 0.1 * groups_hit + 0.08 * keyword_hits
+                            + 0.15 * len(keywords.get("logic", [])) + 0.1 * len(keywords.get("integrations", [])))
+        words = len(description.split())
+        length_score = min(1.0, words / LENGTH_CEILING)
+        similarity = self._nearest_similarity(description, nearest_hits)
+        novelty = 0.5 if similarity is None else 1.0 - similarity
+
+        return {
+            "score": KEYWORD_WEIGHT * keyword_score + LENGTH_WEIGHT * length_score + NOVELTY_WEIGHT * novelty,
+            "keyword_score": keyword_score,
+            "length_score": length_score,
+            "words": words,
+            "nearest_similarity": similarity
+        }
+
+    def route(self, description: str, keywords: Dict[str, List[str]],
+              nearest_hits: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Pick a tier and model for one request"""
+        start = time.perf_counter()
+        features = self.score(description, keywords, nearest_hits)
+        if features["score"] < self.pattern_threshold:
+            tier, model = TIER_PATTERN, None
+        elif features["score"] < self.large_threshold:
+            tier, model = TIER_SMALL, self.small_model
+        else:
+            tier, model = TIER_LARGE, self.large_model
+
+        decision = {
+            "tier": tier,
+            "model": model,
+            "features": features,
+            "routing_time": time.perf_counter() - start,
+            "latency": None,
+            "calls": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost": 0.0
+        }
+        print(f"🧭 Routed to {tier}{f' ({model})' if model else ''} - complexity {features['score']:.2f}")
+        return decision
+
+    def record_outcome(self, decision: Dict[str, Any], latency: float):
+        """Store a finished decision with its end-to-end latency and estimated cost"""
+        input_cost, output_cost = MODEL_COSTS.get(decision["model"] or "", (0.0, 0.0))
+        decision["latency"] = latency
+        decision["cost"] = (decision["prompt_tokens"] * input_cost + decision["completion_tokens"] * output_cost) / 1e6
+        with self._lock:
+            self.decisions.append(decision)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-tier counts, latency and cost, plus the estimated saving versus sending everything large"""
+        with self._lock:
+            decisions = list(self.decisions)
+        tiers = {}
+        saved = 0.0
+        large_input, large_output = MODEL_COSTS.get(self.large_model, (0.0, 0.0))
+        # Requests that skipped the model are assumed to have needed an average-sized call
+        model_calls = [d for d in decisions if d["calls"]]
+        avg_prompt = sum(d["prompt_tokens"] for d in model_calls) / len(model_calls) if model_calls else 0.0
+        avg_completion = sum(d["completion_tokens"] for d in model_calls) / len(model_calls) if model_calls else 0.0
+        for decision in decisions:
+            tier = tiers.setdefault(decision["tier"], {"requests": 0, "total_latency": 0.0, "cost": 0.0, "tokens": 0})
+            tier["requests"] += 1
+            tier["total_latency"] += decision["latency"] or 0.0
+            tier["cost"] += decision["cost"]
+            tier["tokens"] += decision["prompt_tokens"] + decision["completion_tokens"]
+            if decision["calls"]:
+                prompt_tokens, completion_tokens = decision["prompt_tokens"], decision["completion_tokens"]
+            else:
+                prompt_tokens, completion_tokens = avg_prompt, avg_completion
+            saved += (prompt_tokens * large_input + completion_tokens * large_output) / 1e6 - decision["cost"]
+        for tier in tiers.values():
+            tier["avg_latency"] = tier.pop("total_latency") / tier["requests"]
+        return {
+            "requests": len(decisions),
+            "tiers": tiers,
+            "estimated_savings": saved,
+            "recent": [
+                {"tier": d["tier"], "model": d["model"], "score": round(d["features"]["score"], 3),
+                 "latency": d["latency"]}
+                for d in decisions[-10:]
+            ]
+        }
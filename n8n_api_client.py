@@ -1,15 +1,47 @@
+import asyncio
+import functools
 import requests
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable, Iterator, Iterable
 import json
 import os
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Field projection used when callers only need to list workflows (no node bodies)
+SUMMARY_FIELDS = ("id", "name", "active", "createdAt", "updatedAt", "tags")
+
+# Status codes that are safe to retry with backoff (rate limiting and transient server errors)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Methods that may be resent after a 5xx or read timeout without side effects
+IDEMPOTENT_METHODS = frozenset(["GET", "PUT", "DELETE"])
+
+
+class IdempotentRetry(Retry):
+    """Retry policy that never resends a POST the server may already have processed
+
+    Status and read-timeout retries apply to idempotent methods only. A POST is retried on
+    connect errors (urllib3 retries those for any method) or on 429 with a Retry-After header.
+    """
+
+    def is_retry(self, method: str, status_code: int, has_retry_after: bool = False) -> bool:
+        if method.upper() == "POST":
+            return bool(self.total) and status_code == 429 and has_retry_after
+        return super().is_retry(method, status_code, has_retry_after)
+
 
 class N8nAPIClient:
-    def __init__(self, base_url: str, api_key: Optional[str] = None):
+    def __init__(self, base_url: str, api_key: Optional[str] = None, pool_size: int = 10,
+                 timeout: float = 30, max_retries: int = 3, backoff_factor: float = 0.5):
         """Initialize n8n API client"""
         self.base_url = base_url.rstrip('/')
         self.api_key = api_key
+        self.timeout = timeout
+        self.pool_size = pool_size
         self.headers = {
             'Content-Type': 'application/json',
             'Accept': 'application/json'
@@ -18,12 +50,83 @@ class N8nAPIClient:
         if api_key:
             self.headers['X-N8N-API-KEY'] = api_key
         
+        # Shared keep-alive session so every call reuses pooled TCP/TLS connections
+        self.session = self._create_session(pool_size, max_retries, backoff_factor)
+        self.request_count = 0
+        # AsyncN8nAPIClient calls this client from worker threads
+        self._count_lock = threading.Lock()
+        
         print(f"✅ N8N API Client initialized for: {self.base_url}")
     
-    def test_connection(self) -> Dict[str, Any]:
+    def _create_session(self, pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        """Create a pooled session with retry/backoff on 429 and 5xx responses (idempotent methods only)"""
+        retry = IdempotentRetry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+    
+    def _request(self, method: str, path: str, timeout: Optional[float] = None, **kwargs) -> requests.Response:
+        """Send a request through the pooled session with a per-call timeout"""
+        with self._count_lock:
+            self.request_count += 1
+        return self.session.request(
+            method,
+            f"{self.base_url}{path}",
+            timeout=timeout if timeout is not None else self.timeout,
+            **kwargs
+        )
+    
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Get connection reuse statistics for the pooled session"""
+        connections_opened = 0
+        pool_requests = 0
+        
+        for adapter in set(self.session.adapters.values()):
+            pools = getattr(adapter, "poolmanager", None)
+            if pools is None:
+                continue
+            for key in list(pools.pools.keys()):
+                pool = pools.pools.get(key)
+                if pool is None:
+                    continue
+                connections_opened += pool.num_connections
+                pool_requests += pool.num_requests
+        
+        reused = max(pool_requests - connections_opened, 0)
+        return {
+            "requests": self.request_count,
+            "pool_requests": pool_requests,
+            "connections_opened": connections_opened,
+            "connections_reused": reused,
+            "reuse_ratio": reused / pool_requests if pool_requests else 0.0,
+            "pool_size": self.pool_size
+        }
+    
+    def close(self):
+        """Close the pooled session and release its connections"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+    
+    def test_connection(self, timeout: Optional[float] = 10) -> Dict[str, Any]:
         """Test connection to n8n"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/workflows", headers=self.headers, timeout=10)
+            response = self._request("GET", "/api/v1/workflows", timeout=timeout)
             if response.status_code == 200:
                 return {"status": "success", "message": "Connected to n8n successfully"}
             else:
@@ -33,25 +136,86 @@ class N8nAPIClient:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def get_workflows(self) -> Dict[str, Any]:
-        """Get all workflows from n8n"""
+    def _fetch_workflow_page(self, limit: int, cursor: Optional[str] = None, active: Optional[bool] = None,
+                             tags: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Fetch a single page of workflows from n8n's cursor-paginated listing"""
+        params = {"limit": limit}
+        if cursor:
+            params["cursor"] = cursor
+        if active is not None:
+            params["active"] = str(active).lower()
+        if tags:
+            params["tags"] = tags
+        
+        response = self._request("GET", "/api/v1/workflows", params=params, timeout=timeout)
+        if response.status_code != 200:
+            raise requests.HTTPError(f"HTTP {response.status_code}: {response.text}", response=response)
+        return response.json()
+    
+    def iter_workflow_pages(self, limit: int = 100, fields: Optional[Iterable[str]] = None,
+                            active: Optional[bool] = None, tags: Optional[str] = None,
+                            prefetch: bool = False, timeout: Optional[float] = None) -> Iterator[List[Dict[str, Any]]]:
+        """Lazily yield pages of workflows, following nextCursor until the listing is exhausted
+        
+        fields projects each workflow down to the given keys (e.g. SUMMARY_FIELDS) so node bodies
+        are dropped page by page. With prefetch=True the next page is requested in the background
+        while the caller processes the current one.
+        """
+        fields = tuple(fields) if fields else None
+        
+        def project(page: Dict[str, Any]) -> List[Dict[str, Any]]:
+            workflows = page.get("data", [])
+            if fields:
+                workflows = [{key: wf[key] for key in fields if key in wf} for wf in workflows]
+            return workflows
+        
+        def fetch(cursor: Optional[str]) -> Dict[str, Any]:
+            return self._fetch_workflow_page(limit, cursor, active=active, tags=tags, timeout=timeout)
+        
+        if not prefetch:
+            cursor = None
+            while True:
+                page = fetch(cursor)
+                cursor = page.get("nextCursor")
+                yield project(page)
+                if not cursor:
+                    return
+        
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="n8n-prefetch") as executor:
+            future = executor.submit(fetch, None)
+            while future is not None:
+                page = future.result()
+                cursor = page.get("nextCursor")
+                future = executor.submit(fetch, cursor) if cursor else None
+                yield project(page)
+    
+    def iter_workflows(self, limit: int = 100, fields: Optional[Iterable[str]] = None,
+                       active: Optional[bool] = None, tags: Optional[str] = None,
+                       prefetch: bool = False, timeout: Optional[float] = None) -> Iterator[Dict[str, Any]]:
+        """Lazily yield workflows one at a time across all pages"""
+        for page in self.iter_workflow_pages(limit, fields, active, tags, prefetch, timeout):
+            yield from page
+    
+    def get_workflows(self, timeout: Optional[float] = None, *, fields: Optional[Iterable[str]] = None,
+                      limit: int = 100) -> Dict[str, Any]:
+        """Get all workflows from n8n (follows pagination; use iter_workflows to stream instead)"""
         try:
-            response = requests.get(f"{self.base_url}/api/v1/workflows", headers=self.headers)
-            if response.status_code == 200:
-                return {"status": "success", "workflows": response.json()}
-            else:
-                return {"status": "error", "message": f"HTTP {response.status_code}"}
+            workflows = list(self.iter_workflows(limit=limit, fields=fields, timeout=timeout))
+            return {"status": "success", "workflows": {"data": workflows, "nextCursor": None}}
+        except requests.HTTPError as e:
+            return {"status": "error", "message": str(e).split(":")[0]}
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def create_workflow(self, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
+    def create_workflow(self, workflow_data: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
         """Create a new workflow in n8n"""
         try:
             print(f"🚀 Creating workflow: {workflow_data.get('name')}")
-            response = requests.post(
-                f"{self.base_url}/api/v1/workflows",
-                headers=self.headers,
-                json=workflow_data
+            response = self._request(
+                "POST",
+                "/api/v1/workflows",
+                json=workflow_data,
+                timeout=timeout
             )
             
             print(f"📡 API Response: {response.status_code}")
@@ -76,13 +240,15 @@ class N8nAPIClient:
             print(f"❌ Exception during creation: {error_msg}")
             return {"status": "error", "message": error_msg}
     
-    def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any]) -> Dict[str, Any]:
+    def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any],
+                        timeout: Optional[float] = None) -> Dict[str, Any]:
         """Update existing workflow"""
         try:
-            response = requests.put(
-                f"{self.base_url}/api/v1/workflows/{workflow_id}",
-                headers=self.headers,
-                json=workflow_data
+            response = self._request(
+                "PUT",
+                f"/api/v1/workflows/{workflow_id}",
+                json=workflow_data,
+                timeout=timeout
             )
             
             if response.status_code == 200:
@@ -93,12 +259,13 @@ class N8nAPIClient:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def activate_workflow(self, workflow_id: str) -> Dict[str, Any]:
+    def activate_workflow(self, workflow_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Activate a workflow"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/v1/workflows/{workflow_id}/activate",
-                headers=self.headers
+            response = self._request(
+                "POST",
+                f"/api/v1/workflows/{workflow_id}/activate",
+                timeout=timeout
             )
             
             if response.status_code == 200:
@@ -109,14 +276,16 @@ class N8nAPIClient:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def execute_workflow(self, workflow_id: str, data: Dict[str, Any] = None) -> Dict[str, Any]:
+    def execute_workflow(self, workflow_id: str, data: Dict[str, Any] = None,
+                         timeout: Optional[float] = None) -> Dict[str, Any]:
         """Execute a workflow manually"""
         try:
             payload = {"workflowData": data} if data else {}
-            response = requests.post(
-                f"{self.base_url}/api/v1/workflows/{workflow_id}/execute",
-                headers=self.headers,
-                json=payload
+            response = self._request(
+                "POST",
+                f"/api/v1/workflows/{workflow_id}/execute",
+                json=payload,
+                timeout=timeout
             )
             
             if response.status_code == 201:
@@ -127,7 +296,7 @@ class N8nAPIClient:
         except Exception as e:
             return {"status": "error", "message": str(e)}
     
-    def create_workflow_with_debug(self, workflow_data):
+    def create_workflow_with_debug(self, workflow_data, timeout: Optional[float] = None):
         """Enhanced create_workflow method with JSON logging"""
     
     # Create debug directory
@@ -160,9 +329,7 @@ class N8nAPIClient:
     
     # Make the actual API call (your existing logic)
         try:
-            import requests
-            url = f"{self.base_url}/api/v1/workflows"
-            response = requests.post(url, headers=self.headers, json=workflow_data)
+            response = self._request("POST", "/api/v1/workflows", json=workflow_data, timeout=timeout)
             
             # Log the response
             response_file = os.path.join(debug_dir, f"RESPONSE_{workflow_name.replace(' ', '_')}_{timestamp}.json")
@@ -200,10 +367,122 @@ class N8nAPIClient:
             return {'status': 'error', 'message': str(e)}
 
 
+class AsyncN8nAPIClient:
+    def __init__(self, base_url: str, api_key: Optional[str] = None, concurrency: int = 10,
+                 pool_size: Optional[int] = None, timeout: float = 30, max_retries: int = 3,
+                 backoff_factor: float = 0.5):
+        """Initialize asyncio n8n API client with bounded concurrency for bulk operations"""
+        self.concurrency = max(1, concurrency)
+        
+        # Calls run on worker threads over the pooled sync client, so the pool must be
+        # at least as large as the concurrency limit or requests would queue for a socket
+        self.client = N8nAPIClient(
+            base_url,
+            api_key,
+            pool_size=max(pool_size or self.concurrency, self.concurrency),
+            timeout=timeout,
+            max_retries=max_retries,
+            backoff_factor=backoff_factor
+        )
+        self.base_url = self.client.base_url
+        
+        # Dedicated executor so the default loop executor's small worker cap doesn't limit concurrency
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="n8n-api")
+    
+    async def _call(self, func: Callable[..., Dict[str, Any]], *args, **kwargs) -> Dict[str, Any]:
+        """Run a blocking client call without blocking the event loop"""
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+    
+    async def _gather_bounded(self, calls: List[Callable[[], Awaitable[Dict[str, Any]]]]) -> List[Dict[str, Any]]:
+        """Run calls concurrently, at most `concurrency` at a time, preserving input order"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def run(index: int, call: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+            async with semaphore:
+                result = await call()
+            return {"index": index, **result}
+        
+        return await asyncio.gather(*(run(i, call) for i, call in enumerate(calls)))
+    
+    async def test_connection(self, timeout: Optional[float] = 10) -> Dict[str, Any]:
+        """Test connection to n8n"""
+        return await self._call(self.client.test_connection, timeout=timeout)
+    
+    async def create_workflow(self, workflow_data: Dict[str, Any], timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Create a new workflow in n8n"""
+        return await self._call(self.client.create_workflow, workflow_data, timeout=timeout)
+    
+    async def update_workflow(self, workflow_id: str, workflow_data: Dict[str, Any],
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Update existing workflow"""
+        return await self._call(self.client.update_workflow, workflow_id, workflow_data, timeout=timeout)
+    
+    async def activate_workflow(self, workflow_id: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Activate a workflow"""
+        return await self._call(self.client.activate_workflow, workflow_id, timeout=timeout)
+    
+    async def create_many(self, workflows: List[Dict[str, Any]], activate: bool = False,
+                          timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Create many workflows concurrently, optionally activating each one once it is created"""
+        async def create_one(workflow_data: Dict[str, Any]) -> Dict[str, Any]:
+            result = await self.create_workflow(workflow_data, timeout=timeout)
+            if activate and result.get("status") == "success" and result.get("id"):
+                result["activation"] = await self.activate_workflow(result["id"], timeout=timeout)
+            return result
+        
+        return await self._gather_bounded([lambda wf=wf: create_one(wf) for wf in workflows])
+    
+    async def activate_many(self, workflow_ids: List[str], timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Activate many workflows concurrently"""
+        results = await self._gather_bounded([
+            lambda wf_id=wf_id: self.activate_workflow(wf_id, timeout=timeout) for wf_id in workflow_ids
+        ])
+        for wf_id, result in zip(workflow_ids, results):
+            result["id"] = wf_id
+        return results
+    
+    async def update_many(self, updates: List[Tuple[str, Dict[str, Any]]],
+                          timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Update many workflows concurrently from (workflow_id, workflow_data) pairs"""
+        results = await self._gather_bounded([
+            lambda wf_id=wf_id, data=data: self.update_workflow(wf_id, data, timeout=timeout)
+            for wf_id, data in updates
+        ])
+        for (wf_id, _), result in zip(updates, results):
+            result["id"] = wf_id
+        return results
+    
+    def get_connection_stats(self) -> Dict[str, Any]:
+        """Get connection reuse statistics for the underlying pooled session"""
+        return self.client.get_connection_stats()
+    
+    async def close(self):
+        """Close the underlying pooled session and worker threads"""
+        self.executor.shutdown(wait=False)
+        self.client.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
 # Test the connection
 if __name__ == "__main__":
     from config import Config
     
-    client = N8nAPIClient(Config.N8N_BASE_URL, Config.N8N_API_KEY)
+    client = N8nAPIClient(
+        Config.N8N_BASE_URL,
+        Config.N8N_API_KEY,
+        pool_size=Config.N8N_POOL_SIZE,
+        timeout=Config.N8N_TIMEOUT,
+        max_retries=Config.N8N_MAX_RETRIES
+    )
     result = client.test_connection()
-    print(f"Connection test: {result}")
\ No newline at end of file
+    print(f"Connection test: {result}")
+    print(f"Connection stats: {client.get_connection_stats()}")
\ No newline at end of file
@@ -26,6 +26,11 @@ st.set_page_config(
 # Load environment variables
 load_dotenv()
 
+@st.cache_resource
+def get_chroma_client():
+    """One ChromaDB client (and heartbeat thread) per server process, reused across reruns"""
+    return WorkflowGeneratorAgent.create_chroma_client(Config.CHROMA_HOST, Config.CHROMA_PORT)
+
 # Initialize Workflow Agent
 try:
     Config.validate_config()
@@ -34,7 +39,8 @@ try:
         n8n_base_url=Config.N8N_BASE_URL,
         n8n_api_key=Config.N8N_API_KEY,
         chroma_host=Config.CHROMA_HOST,
-        chroma_port=Config.CHROMA_PORT
+        chroma_port=Config.CHROMA_PORT,
+        chroma_client=get_chroma_client()
     )
     st.success("⭐ Star Agent(Workflow Generator) initialized successfully!")
 except Exception as e:
@@ -708,7 +714,13 @@ def main():
             # Test ChromaDB connection
             try:
                 if workflow_agent and hasattr(workflow_agent, 'chroma_client'):
-                    st.write("✅ ChromaDB: Connected")
+                    health = workflow_agent.chroma_client.get_health()
+                    if health['degraded']:
+                        st.write(f"⚠️ ChromaDB: Degraded ({health['state']}, read-only snapshot)")
+                    elif health['connected']:
+                        st.write("✅ ChromaDB: Connected")
+                    else:
+                        st.write("⏳ ChromaDB: Not connected yet")
                 else:
                     st.write("⚠️ ChromaDB: Unknown")
             except:
@@ -895,7 +907,18 @@ def main():
                 status_text.text("⚙️ Generating workflow structure...")
                 progress_bar.progress(50)
                 
-                result = workflow_agent.process_request(agent_input.strip())
+                # Show nodes as the model streams them
+                streamed_nodes = []
+                
+                def show_node(node):
+                    streamed_nodes.append(node)
+                    status_text.text(f"🧩 Node {len(streamed_nodes)}: {node.get('name', 'Unnamed')}")
+                
+                workflow_agent.node_callback = show_node
+                try:
+                    result = workflow_agent.process_request(agent_input.strip())
+                finally:
+                    workflow_agent.node_callback = None
                 progress_bar.progress(75)
                 
                 # Step 3: Saving workflow
@@ -1,97 +1,238 @@
-import chromadb
 import json
+import os
 import sys
+import time
+import argparse
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Iterator, Tuple, Optional
 
-def setup_workflows_in_chroma():
+from chromadb_client import CHROMA_BACKENDS, create_chroma_client
+from embedding_cache import CachedEmbeddingFunction, DEFAULT_CACHE_PATH
+from workflow_library import (build_workflow_document, iter_catalog_entries, discover_workflow_files,
+                              save_skeletons, SKELETON_FILE)
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_WORKERS = 4
+CHECKPOINT_FILE = ".chroma_ingest_checkpoint.json"
+
+
+def iter_batches(path: str, batch_size: int) -> Iterator[Tuple[int, List[str], List[str], List[Dict[str, Any]]]]:
+    """Group workflow metadata into (batch_number, ids, documents, metadatas) batches"""
+    ids, documents, metadatas = [], [], []
+    batch_number = 0
+
+    for workflow_id, wf, source_file, entry_hash in iter_catalog_entries(path):
+        # Stable title-derived ids so incremental sync can match entries across runs
+        document_text, metadata = build_workflow_document(wf, workflow_id, source_file, entry_hash)
+        ids.append(workflow_id)
+        documents.append(document_text)
+        metadatas.append(metadata)
+
+        if len(ids) >= batch_size:
+            yield batch_number, ids, documents, metadatas
+            ids, documents, metadatas = [], [], []
+            batch_number += 1
+
+    if ids:
+        yield batch_number, ids, documents, metadatas
+
+
+def load_checkpoint(path: str, source: str, batch_size: int) -> set:
+    """Load completed batch numbers from a previous run of the same source and batch size"""
+    if not os.path.exists(path):
+        return set()
+    try:
+        with open(path, 'r') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('source') != source or checkpoint.get('batch_size') != batch_size:
+            print("⚠️ Checkpoint does not match this run, starting from scratch")
+            return set()
+        return set(checkpoint.get('completed_batches', []))
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️ Ignoring unreadable checkpoint: {e}")
+        return set()
+
+
+def save_checkpoint(path: str, source: str, batch_size: int, completed: set):
+    """Atomically record completed batch numbers so an interrupted run can resume"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'source': source,
+            'batch_size': batch_size,
+            'completed_batches': sorted(completed)
+        }, f)
+    os.replace(tmp_path, path)
+
+
+def ingest_workflows(collection, path: str = 'workflow_metadata.json', batch_size: int = DEFAULT_BATCH_SIZE,
+                     workers: int = DEFAULT_WORKERS, checkpoint_path: str = CHECKPOINT_FILE,
+                     resume: bool = True) -> Dict[str, Any]:
+    """Stream workflow metadata into ChromaDB in parallel batches with checkpointing"""
+    source = os.path.abspath(path)
+    completed = load_checkpoint(checkpoint_path, source, batch_size) if resume else set()
+    if completed:
+        print(f"⏩ Resuming: {len(completed)} batches already ingested")
+
+    lock = threading.Lock()
+    stats = {'documents': 0, 'batches': 0, 'skipped_batches': 0}
+    start = time.perf_counter()
+
+    def upsert_batch(batch_number, ids, documents, metadatas):
+        # upsert keeps re-runs of a partially ingested batch idempotent
+        collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+        with lock:
+            completed.add(batch_number)
+            stats['documents'] += len(ids)
+            stats['batches'] += 1
+            save_checkpoint(checkpoint_path, source, batch_size, completed)
+            elapsed = time.perf_counter() - start
+            print(f"💾 Batch {batch_number + 1}: {len(ids)} docs "
+                  f"({stats['documents'] / elapsed:.1f} docs/sec overall)")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for batch_number, ids, documents, metadatas in iter_batches(path, batch_size):
+            if batch_number in completed:
+                stats['skipped_batches'] += 1
+                continue
+            pending.add(executor.submit(upsert_batch, batch_number, ids, documents, metadatas))
+
+            # Bound in-flight batches so memory stays flat regardless of catalog size
+            if len(pending) >= workers * 2:
+                done = next(as_completed(pending))
+                pending.remove(done)
+                done.result()
+
+        for future in as_completed(pending):
+            future.result()
+
+    elapsed = time.perf_counter() - start
+    stats['seconds'] = elapsed
+    stats['docs_per_sec'] = stats['documents'] / elapsed if elapsed > 0 else 0.0
+
+    # A fully successful run needs no checkpoint
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    return stats
+
+
+def sync_workflows(collection, path: str = 'workflow_metadata.json', batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """Incrementally sync the catalog: re-embed only new/changed entries and delete removed ones"""
+    start = time.perf_counter()
+
+    # Only metadata is needed to compare hashes; documents and embeddings stay on the server
+    existing = collection.get(include=["metadatas"])
+    existing_hashes = {}
+    for workflow_id, metadata in zip(existing['ids'], existing['metadatas'] or []):
+        metadata = metadata or {}
+        # Manage catalog entries and legacy positional ids (w1..wN); leave stored/generated workflows alone
+        if metadata.get('source') == 'catalog' or re.fullmatch(r'w\d+', workflow_id):
+            existing_hashes[workflow_id] = metadata.get('content_hash')
+
+    stats = {'added': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0}
+    seen = set()
+    ids, documents, metadatas = [], [], []
+
+    def flush():
+        if ids:
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+            ids.clear()
+            documents.clear()
+            metadatas.clear()
+
+    for workflow_id, wf, source_file, entry_hash in iter_catalog_entries(path):
+        seen.add(workflow_id)
+        if existing_hashes.get(workflow_id) == entry_hash:
+            stats['unchanged'] += 1
+            continue
+
+        stats['updated' if workflow_id in existing_hashes else 'added'] += 1
+        document_text, metadata = build_workflow_document(wf, workflow_id, source_file, entry_hash)
+        ids.append(workflow_id)
+        documents.append(document_text)
+        metadatas.append(metadata)
+        if len(ids) >= batch_size:
+            flush()
+    flush()
+
+    stale = [workflow_id for workflow_id in existing_hashes if workflow_id not in seen]
+    for i in range(0, len(stale), batch_size):
+        collection.delete(ids=stale[i:i + batch_size])
+    stats['deleted'] = len(stale)
+
+    stats['seconds'] = time.perf_counter() - start
+    return stats
+
+
+def setup_workflows_in_chroma(host: str = "localhost", port: int = 8000, path: str = 'workflow_metadata.json',
+                              batch_size: int = DEFAULT_BATCH_SIZE, workers: int = DEFAULT_WORKERS,
+                              resume: bool = True, sync: bool = False,
+                              embedding_cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+                              backend: str = "http", chroma_path: str = "./chroma_data"):
     try:
-        print("🔌 Connecting to ChromaDB server...")
-        # Connect to local ChromaDB server
-        client = chromadb.HttpClient(host="localhost", port=8000)
-        
+        print(f"🔌 Connecting to ChromaDB ({backend} backend)...")
+        client = create_chroma_client(backend, host=host, port=port, path=chroma_path)
+
         # Test connection
         client.heartbeat()
-        print("✅ Connected to ChromaDB server!")
-        
+        print("✅ Connected to ChromaDB!")
+
         # Create or get collection
         print("📁 Creating/accessing collection...")
+        collection_kwargs = {}
+        if embedding_cache_path:
+            # Unchanged documents are served from the shared embedding cache instead of the model
+            collection_kwargs['embedding_function'] = CachedEmbeddingFunction(path=embedding_cache_path)
         collection = client.get_or_create_collection(
             name="n8n_workflows",
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
-        )
-        
-        # Load workflow metadata
-        print("📖 Loading workflow metadata...")
-        with open('workflow_metadata.json', 'r') as f:
-            data = json.load(f)
-            workflows = data['workflows_metadata']  # Extract the workflows array
-        
-        # Clear existing data (optional - uncomment if needed)
-        # print("🗑️ Clearing existing data...")
-        # collection.delete()
-        
-        # Prepare data for batch insertion
-        ids = []
-        documents = []
-        metadatas = []
-        
-        print("🔄 Processing workflows...")
-        for i, wf in enumerate(workflows):
-            # Create unique ID since your data doesn't have IDs
-            workflow_id = f"w{i+1}"
-            
-            # Create searchable document text
-            document_text = f"""
-            Title: {wf['title']}
-            Description: {wf['description']}
-            Domain: {wf['domain']}
-            Tags: {', '.join(wf['tags'])}
-            Parameters: {', '.join(wf['parameter_types'])}
-            """.strip()
-            
-            # FIX: Convert lists to strings for ChromaDB compatibility
-            metadata_with_id = {
-                'id': workflow_id,
-                'title': wf['title'],
-                'description': wf['description'],
-                'domain': wf['domain'],
-                'tags': ', '.join(wf['tags']),  # Convert list to comma-separated string
-                'parameter_types': ', '.join(wf['parameter_types'])  # Convert list to comma-separated string
-            }
-            
-            ids.append(workflow_id)
-            documents.append(document_text)
-            metadatas.append(metadata_with_id)
-        
-        # Insert all workflows at once
-        print("💾 Storing workflows in ChromaDB...")
-        collection.add(
-            ids=ids,
-            documents=documents,
-            metadatas=metadatas
+            metadata={"hnsw:space": "cosine"},  # Use cosine similarity
+            **collection_kwargs
         )
-        
+
+        if sync:
+            # Re-embed only entries whose content hash changed
+            print("🔄 Syncing changed workflows...")
+            stats = sync_workflows(collection, path, batch_size=batch_size)
+            print(f"⚡ Sync done in {stats['seconds']:.2f}s: {stats['added']} added, {stats['updated']} updated, "
+                  f"{stats['unchanged']} unchanged, {stats['deleted']} deleted")
+        else:
+            # Stream workflow metadata into the collection in batches
+            print(f"🔄 Ingesting workflows (batch size {batch_size}, {workers} workers)...")
+            stats = ingest_workflows(collection, path, batch_size=batch_size, workers=workers, resume=resume)
+            print(f"⚡ Ingested {stats['documents']} docs in {stats['seconds']:.2f}s "
+                  f"({stats['docs_per_sec']:.1f} docs/sec, {stats['skipped_batches']} batches resumed)")
+
+        # Few-shot skeletons of the linked exports, read by the generator at prompt time
+        directory = os.path.dirname(os.path.abspath(path))
+        skeleton_count = save_skeletons(discover_workflow_files(directory), os.path.join(directory, SKELETON_FILE))
+        print(f"🦴 Cached {skeleton_count} workflow skeletons for few-shot prompts")
+
         # Verify insertion
         count = collection.count()
         print(f"✅ Successfully stored {count} workflows in ChromaDB!")
-        
+
         # Test a sample query
         print("\n🔍 Testing search functionality...")
         results = collection.query(
             query_texts=["help me with employee onboarding and setup"],
             n_results=2
         )
-        
+
         print("Sample search results:")
         for i, doc_id in enumerate(results['ids'][0]):
             metadata = results['metadatas'][0][i]
             distance = results['distances'][0][i]
             print(f"  {i+1}. {metadata['title']} (similarity: {1-distance:.3f})")
-            
+
     except FileNotFoundError:
-        print("❌ Error: workflow_metadata.json not found!")
+        print(f"❌ Error: {path} not found!")
         print("   Make sure the file exists in the current directory.")
         sys.exit(1)
-        
+
     except Exception as e:
         if "Connection refused" in str(e):
             print("❌ Error: Cannot connect to ChromaDB server!")
@@ -101,4 +242,29 @@ def setup_workflows_in_chroma():
         sys.exit(1)
 
 if __name__ == "__main__":
-    setup_workflows_in_chroma()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load workflow metadata into ChromaDB")
+    parser.add_argument("--backend", choices=CHROMA_BACKENDS, default="http")
+    parser.add_argument("--path", default="./chroma_data", help="Data directory for persistent/numpy backends")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--file", default="workflow_metadata.json")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--no-resume", action="store_true", help="Ignore any existing checkpoint")
+    parser.add_argument("--sync", action="store_true", help="Only re-embed new/changed entries and delete removed ones")
+    parser.add_argument("--embedding-cache", default=DEFAULT_CACHE_PATH,
+                        help="SQLite embedding cache path (empty string disables caching)")
+    args = parser.parse_args()
+
+    setup_workflows_in_chroma(
+        host=args.host,
+        port=args.port,
+        path=args.file,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        resume=not args.no_resume,
+        sync=args.sync,
+        embedding_cache_path=args.embedding_cache or None,
+        backend=args.backend,
+        chroma_path=args.path
+    )
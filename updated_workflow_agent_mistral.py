@@ -2,6 +2,7 @@ from langchain.agents import initialize_agent, Tool, AgentType
 from langchain_mistralai import ChatMistralAI
 from langchain.memory import ConversationBufferMemory
 from langchain.schema import SystemMessage
+import asyncio
 import os
 import json
 from typing import Dict, Any, List
@@ -17,19 +18,27 @@ from datetime import datetime
 
 # Import our custom classes
 from chromadb_client import WorkflowChromaDB
-from n8n_api_client import N8nAPIClient
+from n8n_api_client import N8nAPIClient, AsyncN8nAPIClient
 from workflow_generator import EnhancedN8nWorkflowGenerator
+from model_router import ModelRouter
+from keyword_analyzer import analyze_keywords
+from workflow_library import SkeletonStore
 from mistralai import Mistral
+from config import Config
+from hybrid_search import detect_domain
 
 class WorkflowGeneratorAgent:
     def __init__(self, mistral_api_key: str, n8n_base_url: str, n8n_api_key: str = None, 
-             chroma_host: str = "localhost", chroma_port: int = 8000):
-        """Initialize the Workflow Generator Agent with Mistral AI"""
+             chroma_host: str = "localhost", chroma_port: int = 8000, chroma_client: WorkflowChromaDB = None):
+        """Initialize the Workflow Generator Agent with Mistral AI
+        
+        Pass `chroma_client` to share one WorkflowChromaDB (and its heartbeat thread) between agents.
+        """
 
         # Initialize Mistral AI LLM
         self.llm = ChatMistralAI(
             mistral_api_key=mistral_api_key,
-            model="mistral-medium",  # You can change to mistral-small or mistral-large
+            model=Config.MISTRAL_MODEL,  # Tool selection only; generation is routed separately
             temperature=0.7
         )
 
@@ -37,11 +46,44 @@ class WorkflowGeneratorAgent:
         self.client = Mistral(api_key=mistral_api_key)
 
         # Initialize clients
-        self.chroma_client = WorkflowChromaDB(host=chroma_host, port=chroma_port)
-        self.n8n_client = N8nAPIClient(n8n_base_url, n8n_api_key)
+        self.chroma_client = chroma_client or self.create_chroma_client(chroma_host, chroma_port)
+        self.n8n_client = N8nAPIClient(
+            n8n_base_url,
+            n8n_api_key,
+            pool_size=Config.N8N_POOL_SIZE,
+            timeout=Config.N8N_TIMEOUT,
+            max_retries=Config.N8N_MAX_RETRIES
+        )
+
+        # Route generation by complexity (uses ChromaDB nearest-neighbour similarity as one signal)
+        router = None
+        if Config.MODEL_ROUTING:
+            router = ModelRouter(
+                small_model=Config.ROUTER_SMALL_MODEL,
+                large_model=Config.ROUTER_LARGE_MODEL,
+                pattern_threshold=Config.ROUTER_PATTERN_THRESHOLD,
+                large_threshold=Config.ROUTER_LARGE_THRESHOLD,
+                chroma_client=self.chroma_client
+            )
 
         # Initialize enhanced generator with the correct client
-        self.enhanced_generator = EnhancedN8nWorkflowGenerator(mistral_client=self.client)
+        self.enhanced_generator = EnhancedN8nWorkflowGenerator(
+            mistral_client=self.client,
+            use_cache=Config.GENERATION_CACHE,
+            cache_path=Config.GENERATION_CACHE_PATH,
+            cache_max_entries=Config.GENERATION_CACHE_SIZE,
+            timeout=Config.MISTRAL_TIMEOUT,
+            speculative_k=Config.SPECULATIVE_GENERATIONS,
+            speculative_models=Config.SPECULATIVE_MODELS,
+            router=router,
+            retriever=self.chroma_client,
+            skeleton_store=SkeletonStore(Config.WORKFLOW_SKELETONS_PATH, directory=Config.WORKFLOW_LIBRARY_DIR),
+            few_shot_k=Config.FEW_SHOT_EXAMPLES,
+            few_shot_min_similarity=Config.FEW_SHOT_MIN_SIMILARITY,
+            template_threshold=Config.TEMPLATE_THRESHOLD,
+            template_llm_edit=Config.TEMPLATE_LLM_EDIT,
+            registry_path=Config.WORKFLOW_REGISTRY_PATH or None
+        )
 
         # Initialize memory
         self.memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True)
@@ -49,6 +91,11 @@ class WorkflowGeneratorAgent:
         # Initialize storage for generated workflows
         self.last_generated_workflow = None
         self.current_workflow = None
+        # Generated in this session but not yet deployed (deployed together by deploy_all_workflows)
+        self.pending_workflows = []
+        
+        # Optional callback receiving each node while the model is still streaming (set by the UI)
+        self.node_callback = None
 
         # Initialize agent with tools - FIXED: Use the correct method names with underscores
         self.tools = [
@@ -67,6 +114,11 @@ class WorkflowGeneratorAgent:
                 description="Deploy the generated workflow to n8n with debug logging",
                 func=self.debug_and_deploy  # This one is correct
             ),
+            Tool(
+                name="deploy_all_workflows",
+                description="Deploy every workflow generated in this session that is not deployed yet, concurrently",
+                func=self._deploy_all_workflows
+            ),
             Tool(
                 name="get_collection_stats",
                 description="Get statistics about the workflow collection",
@@ -84,13 +136,33 @@ class WorkflowGeneratorAgent:
 
         print("✅ Workflow Generator Agent initialized with Mistral AI!")
 
+    @staticmethod
+    def create_chroma_client(chroma_host: str = "localhost", chroma_port: int = 8000) -> WorkflowChromaDB:
+        """WorkflowChromaDB configured from Config"""
+        return WorkflowChromaDB(
+            host=chroma_host,
+            port=chroma_port,
+            cache_size=Config.CHROMA_CACHE_SIZE,
+            cache_ttl=Config.CHROMA_CACHE_TTL,
+            embedding_cache_path=Config.EMBEDDING_CACHE_PATH or None,
+            stats_path=Config.CHROMA_STATS_PATH or None,
+            backend=Config.CHROMA_BACKEND,
+            path=Config.CHROMA_PATH,
+            hybrid_search=Config.HYBRID_SEARCH,
+            snapshot_path=Config.CHROMA_SNAPSHOT_PATH or None,
+            heartbeat_interval=Config.CHROMA_HEARTBEAT_INTERVAL,
+            failure_threshold=Config.CHROMA_FAILURE_THRESHOLD,
+            reset_timeout=Config.CHROMA_RESET_TIMEOUT
+        )
+
     def debug_and_deploy(self, workflow_request="deploy"):
         """Enhanced deployment with JSON logging - ADD THIS METHOD"""
         try:
             if not hasattr(self, 'last_generated_workflow') or not self.last_generated_workflow:
                 return "❌ No workflow to deploy. Generate one first."
             
-            workflow_data = self.last_generated_workflow
+            workflow = self.last_generated_workflow
+            workflow_data = self._prepare_for_deploy(workflow)
             workflow_name = workflow_data.get('name', 'Generated_Workflow')
             
             # Create debug directory
@@ -138,6 +210,9 @@ class WorkflowGeneratorAgent:
             # Deploy
             print(f"\n🚀 Deploying to n8n...")
             result = self.n8n_client.create_workflow(workflow_data)
+            if result.get('status') == 'success':
+                # Deployed: deploy_all_workflows must not create it a second time
+                self.pending_workflows = [wf for wf in self.pending_workflows if wf is not workflow]
             
             # Log result
             result_file = os.path.join(debug_dir, f"{workflow_name.replace(' ', '_')}_result_{timestamp}.json")
@@ -212,6 +287,11 @@ class WorkflowGeneratorAgent:
                 description="Deploy the last generated workflow to n8n. Input should be 'deploy' or confirmation message.",
                 func=self._deploy_workflow
             ),
+            Tool(
+                name="deploy_all_workflows",
+                description="Deploy every workflow generated in this session that is not deployed yet. No input required.",
+                func=self._deploy_all_workflows
+            ),
             Tool(
                 name="get_domain_workflows",
                 description="Get all workflows for a specific domain (HR, Marketing, CRM, Sales, IT). Input should be the domain name.",
@@ -227,15 +307,8 @@ class WorkflowGeneratorAgent:
     def _search_similar_workflows(self, query: str) -> str:
         """Search for similar workflows in ChromaDB"""
         try:
-            # Extract domain if mentioned
-            domain = None
-            domains = ["HR", "Marketing", "CRM", "Sales", "IT"]
-            query_lower = query.lower()
-            
-            for d in domains:
-                if d.lower() in query_lower:
-                    domain = d
-                    break
+            # Extract domain if mentioned as a whole word
+            domain = detect_domain(query, Config.DEFAULT_DOMAINS)
             
             similar_workflows = self.chroma_client.search_similar_workflows(query, domain, n_results=3)
             
@@ -260,11 +333,14 @@ class WorkflowGeneratorAgent:
             print(f"🤖 Generating enhanced workflow for: {description}")
         
             # Use the enhanced workflow generator with AI capabilities
-            workflow_json = self.enhanced_generator.generate_workflow_from_description(description)
+            workflow_json = self.enhanced_generator.generate_workflow_from_description(
+                description, on_node=self.node_callback
+            )
         
             # Store the generated workflow for deployment - FIXED: Ensure it's stored properly
             self.last_generated_workflow = workflow_json
             self.current_workflow = workflow_json
+            self.pending_workflows.append(workflow_json)
             
             # NEW: Immediately persist after generation
             self._ensure_workflow_persistence()
@@ -318,10 +394,9 @@ class WorkflowGeneratorAgent:
             
                 # Add node description if available from registry
                 node_desc = ""
-                if hasattr(self.enhanced_generator, 'node_registry'):
-                    registry_key = node_type.lower().replace('trigger', '').replace('nodes-base.', '')
-                    if registry_key in self.enhanced_generator.node_registry:
-                        node_desc = f" - {self.enhanced_generator.node_registry[registry_key].get('description', '')}"
+                registry_key = self.enhanced_generator.registry.key_for_type(node.get('type', ''))
+                if registry_key:
+                    node_desc = f" - {self.enhanced_generator.node_registry[registry_key].get('description', '')}"
             
                 result += f"\n   {i}. {node_name} ({node_type}){node_desc}"
         
@@ -388,6 +463,7 @@ class WorkflowGeneratorAgent:
                 # FIXED: Store fallback workflow too
                 self.last_generated_workflow = fallback_workflow
                 self.current_workflow = fallback_workflow
+                self.pending_workflows.append(fallback_workflow)
                 
                 # NEW: Persist fallback workflow too
                 self._ensure_workflow_persistence()
@@ -408,17 +484,15 @@ class WorkflowGeneratorAgent:
     def _generate_custom_workflow(self, description: str) -> Dict[str, Any]:
         """Generate a custom workflow when no specific type is detected"""
         try:
-            # Analyze description for common patterns
-            description_lower = description.lower()
-            
-            # Determine components needed
-            has_webhook = any(word in description_lower for word in ['form', 'submit', 'receive', 'trigger', 'webhook'])
-            has_email = any(word in description_lower for word in ['email', 'notify', 'send', 'notification'])
-            has_api = any(word in description_lower for word in ['api', 'integration', 'connect', 'http'])
-            has_condition = any(word in description_lower for word in ['if', 'condition', 'check', 'approve', 'decide'])
-            has_data_processing = any(word in description_lower for word in ['process', 'transform', 'calculate', 'filter'])
-            has_database = any(word in description_lower for word in ['database', 'save', 'store', 'record'])
-            has_slack = any(word in description_lower for word in ['slack', 'chat', 'message', 'team'])
+            # Determine components needed (same compiled keyword matcher as the pattern engine)
+            features = analyze_keywords(description)
+            has_webhook = bool(features["inputs"])
+            has_email = bool(features["notifications"])
+            has_api = bool(features["apis"])
+            has_condition = bool(features["conditions"])
+            has_data_processing = bool(features["processing"])
+            has_database = bool(features["storage"])
+            has_slack = bool(features["chat"])
             
             # Use the workflow generator's basic workflow method with enhanced configuration
             nodes_config = []
@@ -562,24 +636,7 @@ return processedItems;"""
             
             print(f"🚀 Starting deployment process...")
             
-            # Clean the workflow data - remove read-only fields
-            workflow_data = self.last_generated_workflow.copy()
-            
-            # Remove read-only fields that cause API errors
-            fields_to_remove = ['active', 'id', 'createdAt', 'updatedAt', 'versionId']
-            for field in fields_to_remove:
-                if field in workflow_data:
-                    del workflow_data[field]
-            
-            # Ensure required fields are present
-            if 'settings' not in workflow_data:
-                workflow_data['settings'] = {"executionOrder": "v1"}
-            if 'staticData' not in workflow_data:
-                workflow_data['staticData'] = {}
-            if 'connections' not in workflow_data:
-                workflow_data['connections'] = {}
-            if 'tags' not in workflow_data:
-                workflow_data['tags'] = []
+            workflow_data = self._prepare_for_deploy(self.last_generated_workflow)
             
             workflow_name = workflow_data.get('name', 'Generated Workflow')
             node_count = len(workflow_data.get('nodes', []))
@@ -592,6 +649,7 @@ return processedItems;"""
             
             if result["status"] == "success":
                 workflow_id = result["id"]
+                self.pending_workflows = [wf for wf in self.pending_workflows if wf is not self.last_generated_workflow]
                 
                 # Try to get webhook URL if available
                 webhook_info = ""
@@ -633,18 +691,86 @@ return processedItems;"""
             print(error_msg)
             return error_msg
     
+    @staticmethod
+    def _prepare_for_deploy(workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of a generated workflow without read-only fields, with the fields n8n requires"""
+        workflow_data = workflow.copy()
+        
+        # Remove read-only fields that cause API errors
+        for field in ['active', 'id', 'createdAt', 'updatedAt', 'versionId']:
+            workflow_data.pop(field, None)
+        
+        # Ensure required fields are present
+        workflow_data.setdefault('settings', {"executionOrder": "v1"})
+        workflow_data.setdefault('staticData', {})
+        workflow_data.setdefault('connections', {})
+        workflow_data.setdefault('tags', [])
+        return workflow_data
+    
+    def deploy_workflows(self, workflows: List[Dict[str, Any]], activate: bool = False) -> List[Dict[str, Any]]:
+        """Deploy a batch of workflows concurrently (at most N8N_CONCURRENCY requests in flight)"""
+        prepared = [self._prepare_for_deploy(workflow) for workflow in workflows]
+        
+        async def deploy() -> List[Dict[str, Any]]:
+            async with AsyncN8nAPIClient(
+                self.n8n_client.base_url,
+                self.n8n_client.api_key,
+                concurrency=Config.N8N_CONCURRENCY,
+                pool_size=Config.N8N_POOL_SIZE,
+                timeout=Config.N8N_TIMEOUT,
+                max_retries=Config.N8N_MAX_RETRIES
+            ) as client:
+                return await client.create_many(prepared, activate=activate)
+        
+        return asyncio.run(deploy())
+    
+    def _deploy_all_workflows(self, _: str = "") -> str:
+        """Deploy all pending generated workflows in one concurrent batch"""
+        try:
+            if not self.pending_workflows:
+                return "❌ No undeployed workflows. Please generate a workflow first."
+            
+            print(f"🚀 Deploying {len(self.pending_workflows)} workflows...")
+            workflows = self.pending_workflows
+            results = self.deploy_workflows(workflows)
+            
+            lines = []
+            failed = []
+            for workflow, result in zip(workflows, results):
+                name = workflow.get('name', 'Generated Workflow')
+                if result.get("status") == "success":
+                    lines.append(f"   ✅ {name} (ID: {result.get('id')})")
+                else:
+                    failed.append(workflow)
+                    lines.append(f"   ❌ {name}: {result.get('message', 'Unknown error')}")
+            self.pending_workflows = failed
+            
+            deployed = len(workflows) - len(failed)
+            return f"🎉 **Deployed {deployed} of {len(workflows)} workflows**\n\n" + "\n".join(lines)
+        
+        except Exception as e:
+            error_msg = f"❌ Deployment error: {str(e)}"
+            print(error_msg)
+            return error_msg
+    
     def _get_domain_workflows(self, domain: str) -> str:
         """Get all workflows for a specific domain"""
         try:
-            workflows = self.chroma_client.get_all_workflows_by_domain(domain.upper())
+            # Stream only the fields we display instead of materializing full records
+            workflows = self.chroma_client.iter_workflows(
+                domain=domain.upper(),
+                fields=("title", "description", "tags")
+            )
             
-            if workflows:
-                result = f"📁 **{domain.upper()} Domain Workflows** ({len(workflows)} found):\n\n"
-                for i, workflow in enumerate(workflows, 1):
-                    result += f"{i}. **{workflow.get('title', 'Unknown')}**\n"
-                    result += f"   Description: {workflow.get('description', 'No description')}\n"
-                    result += f"   Tags: {workflow.get('tags', 'None')}\n\n"
-                return result
+            lines = []
+            for i, workflow in enumerate(workflows, 1):
+                lines.append(f"{i}. **{workflow.get('title', 'Unknown')}**\n"
+                             f"   Description: {workflow.get('description', 'No description')}\n"
+                             f"   Tags: {workflow.get('tags', 'None')}\n\n")
+            
+            if lines:
+                result = f"📁 **{domain.upper()} Domain Workflows** ({len(lines)} found):\n\n"
+                return result + "".join(lines)
             else:
                 return f"❌ No workflows found in {domain.upper()} domain."
                 
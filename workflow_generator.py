@@ -1,201 +1,826 @@
+import asyncio
+import contextvars
 import json
+import threading
+import time
 import uuid
-from typing import Dict, Any, List, Optional
+from collections import deque
+from typing import Callable, Dict, Any, List, Optional, Tuple
 from datetime import datetime
 import re
 import os
 from mistralai import Mistral
 
+from generation_cache import GenerationCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from model_router import ModelRouter, TIER_PATTERN
+from keyword_analyzer import PATTERN_GROUPS, analyze_keywords, select_groups
+from workflow_registry import WorkflowRegistry, load_registry
+from workflow_layout import ORIGIN, apply_layout, chain_connections, has_overlaps
+from workflow_library import SkeletonStore
+from workflow_stream import IncrementalWorkflowParser, MalformedStreamError
+
+# Static prompt parts, built once per registry version and shared by every generator in the process
+_PROMPT_CACHE: Dict[str, Dict[str, Any]] = {}
+_PROMPT_CACHE_LOCK = threading.Lock()
+
+# Routing decision of the generation running in the current thread/task; model calls add their tokens to it
+_active_route: contextvars.ContextVar = contextvars.ContextVar("active_route", default=None)
+
+# ChromaDB hits per description for the generation running in the current thread/task, so the
+# template lookup, the router and few-shot retrieval share one query
+_library_hits: contextvars.ContextVar = contextvars.ContextVar("library_hits", default=None)
+
+# Library hits considered for the template fast path and the router's nearest-neighbour similarity
+TEMPLATE_CANDIDATES = 3
+
+_TOKEN_ESTIMATE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (words and punctuation, long words split every 4 characters)"""
+    return sum(max(1, (len(piece) + 3) // 4) if piece[0].isalnum() or piece[0] == '_' else 1
+               for piece in _TOKEN_ESTIMATE_RE.findall(text))
+
+
 class EnhancedN8nWorkflowGenerator:
-    def __init__(self, mistral_client=None):
+    def __init__(self, mistral_client=None, model: str = "mistral-large-latest", temperature: float = 0.3,
+                 max_tokens: int = 6000, use_cache: bool = True, cache_path: str = DEFAULT_CACHE_PATH,
+                 cache_max_entries: int = DEFAULT_MAX_ENTRIES, timeout: float = 60,
+                 speculative_k: int = 0, speculative_models: Optional[List[str]] = None,
+                 router: Optional[ModelRouter] = None, retriever=None,
+                 skeleton_store: Optional[SkeletonStore] = None, few_shot_k: int = 2,
+                 few_shot_min_similarity: float = 0.3, template_threshold: Optional[float] = 0.8,
+                 template_llm_edit: bool = True, registry_path: Optional[str] = None):
         """Initialize the enhanced workflow generator with AI capabilities"""
         self.mistral_client = mistral_client
-        self.node_registry = self._initialize_node_registry()
-        self.workflow_templates = self._initialize_workflow_templates()
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        # Node types and patterns come from the shared registry file, loaded on first use
+        self.registry_path = registry_path
+        self.last_stream_stats = None
+        
+        # Per-call latency/token records for the most recent model calls
+        self.call_metrics = deque(maxlen=200)
+        self._metrics_lock = threading.Lock()
+        
+        # Opt-in speculative generation: K concurrent calls, first valid workflow wins
+        self.speculative_k = speculative_k
+        self.speculative_models = speculative_models or []
+        self.speculation_stats = {"runs": 0, "wins": {}, "all_failed": 0, "calls_cancelled": 0}
+        # The Mistral async HTTP client is bound to the loop it first ran on, so the sync API runs
+        # speculative calls on one long-lived loop thread instead of a new asyncio.run() loop each time
+        self._loop = None
+        self._loop_lock = threading.Lock()
+        
+        # Optional tiered routing (pattern engine / small model / large model) by request complexity
+        self.router = router
+        
+        # Retrieval-augmented few-shot: skeletons of the closest stored exports (retriever = WorkflowChromaDB)
+        self.retriever = retriever
+        self.skeleton_store = skeleton_store or (SkeletonStore() if retriever is not None else None)
+        self.few_shot_k = few_shot_k
+        self.few_shot_min_similarity = few_shot_min_similarity
+        self.last_retrieval = None
+        
+        # Template-first fast path: adapt the closest stored export when it is similar enough
+        self.template_threshold = template_threshold
+        self.template_llm_edit = template_llm_edit
+        self.path_latencies = {"template": deque(maxlen=200), "generated": deque(maxlen=200)}
+        
+        # Repeated descriptions are served from disk instead of a fresh LLM call
+        self.generation_cache = GenerationCache(cache_path, max_entries=cache_max_entries) if use_cache else None
         print("✅ Enhanced N8N Workflow Generator initialized")
     
-    def _initialize_node_registry(self) -> Dict[str, Dict]:
+    @property
+    def registry(self) -> WorkflowRegistry:
+        return load_registry(self.registry_path)
+    
+    @property
+    def node_registry(self) -> Dict[str, Dict]:
         """Registry of all available n8n node types with their configurations"""
-        return {
-            "webhook": {
-                "type": "n8n-nodes-base.webhook",
-                "category": "trigger",
-                "description": "Receives HTTP requests",
-                "default_params": {"httpMethod": "POST", "responseMode": "onReceived"}
-            },
-            "manual_trigger": {
-                "type": "n8n-nodes-base.manualTrigger",
-                "category": "trigger",
-                "description": "Manual workflow trigger",
-                "default_params": {}
-            },
-            "schedule": {
-                "type": "n8n-nodes-base.scheduleTrigger",
-                "category": "trigger",
-                "description": "Time-based workflow trigger",
-                "default_params": {"rule": {"interval": [{"field": "hours", "value": 1}]}}
-            },
-            "email_send": {
-                "type": "n8n-nodes-base.emailSend",
-                "category": "action",
-                "description": "Send email notifications",
-                "default_params": {"fromEmail": "noreply@company.com"}
-            },
-            "http_request": {
-                "type": "n8n-nodes-base.httpRequest",
-                "category": "action",
-                "description": "Make HTTP API calls",
-                "default_params": {"method": "POST", "sendHeaders": True}
-            },
-            "function": {
-                "type": "n8n-nodes-base.function",
-                "category": "processing",
-                "description": "Execute custom JavaScript code",
-                "default_params": {}
-            },
-            "code": {
-                "type": "n8n-nodes-base.code",
-                "category": "processing",
-                "description": "Execute JavaScript with full access",
-                "default_params": {"language": "javascript"}
-            },
-            "set": {
-                "type": "n8n-nodes-base.set",
-                "category": "processing",
-                "description": "Set or modify data",
-                "default_params": {"options": {}}
-            },
-            "if": {
-                "type": "n8n-nodes-base.if",
-                "category": "logic",
-                "description": "Conditional branching",
-                "default_params": {}
-            },
-            "switch": {
-                "type": "n8n-nodes-base.switch",
-                "category": "logic",
-                "description": "Multi-path routing",
-                "default_params": {"fallbackOutput": 1}
-            },
-            "merge": {
-                "type": "n8n-nodes-base.merge",
-                "category": "logic",
-                "description": "Merge multiple data streams",
-                "default_params": {"mode": "append"}
-            },
-            "hubspot": {
-                "type": "n8n-nodes-base.hubspot",
-                "category": "crm",
-                "description": "HubSpot CRM integration",
-                "default_params": {"resource": "contact", "operation": "create"}
-            },
-            "salesforce": {
-                "type": "n8n-nodes-base.salesforce",
-                "category": "crm",
-                "description": "Salesforce CRM integration",
-                "default_params": {"resource": "lead", "operation": "create"}
-            },
-            "slack": {
-                "type": "n8n-nodes-base.slack",
-                "category": "communication",
-                "description": "Slack messaging",
-                "default_params": {"resource": "message", "operation": "post"}
-            },
-            "google_sheets": {
-                "type": "n8n-nodes-base.googleSheets",
-                "category": "data",
-                "description": "Google Sheets integration",
-                "default_params": {"resource": "spreadsheet", "operation": "append"}
-            },
-            "wait": {
-                "type": "n8n-nodes-base.wait",
-                "category": "flow",
-                "description": "Wait for specified time",
-                "default_params": {"unit": "seconds", "amount": 5}
-            }
-        }
+        return self.registry.nodes
     
-    def _initialize_workflow_templates(self) -> Dict[str, Dict]:
-        """Initialize workflow pattern templates"""
-        return {
-            "simple_automation": {
-                "pattern": ["trigger", "processing", "action"],
-                "description": "Basic automation workflow"
-            },
-            "approval_workflow": {
-                "pattern": ["trigger", "processing", "notification", "logic", "action"],
-                "description": "Workflow with approval steps"
-            },
-            "data_processing": {
-                "pattern": ["trigger", "processing", "logic", "action", "notification"],
-                "description": "Data processing and routing"
-            },
-            "crm_integration": {
-                "pattern": ["trigger", "processing", "crm", "logic", "notification"],
-                "description": "CRM integration workflow"
-            },
-            "multi_channel": {
-                "pattern": ["trigger", "processing", "logic", "action", "communication", "data"],
-                "description": "Multi-channel automation"
-            }
-        }
+    @property
+    def workflow_templates(self) -> Dict[str, Dict]:
+        return self.registry.patterns
     
-    def generate_workflow_from_description(self, description: str) -> Dict[str, Any]:
-        """Generate a complete n8n workflow from natural language description"""
+    @property
+    def registry_version(self) -> str:
+        """Registry file version + content hash; keys every prompt/generation cache"""
+        return self.registry.version
+    
+    def generate_workflow_from_description(self, description: str, use_cache: bool = True,
+                                           on_node: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Generate a complete n8n workflow from natural language description
+        
+        With `on_node`, the model response is streamed and each node is passed to the callback as
+        soon as its JSON is complete (cached generations replay their nodes immediately).
+        """
         print(f"🤖 Generating workflow for: {description}")
+        hits_token = _library_hits.set({})
+        try:
+            return self._generate_workflow(description, use_cache, on_node)
+        finally:
+            _library_hits.reset(hits_token)
+    
+    def _generate_workflow(self, description: str, use_cache: bool,
+                           on_node: Optional[Callable[[Dict[str, Any]], None]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        template_workflow = self._generate_from_template(description, on_node)
+        if template_workflow is not None:
+            self._record_path("template", started)
+            return template_workflow
+        
+        decision, route_token, start = self._begin_route(description)
+        model = decision["model"] if decision else None
         
         try:
             # Use AI if available, otherwise use pattern matching
+            if decision is not None and decision["tier"] == TIER_PATTERN:
+                return self._generate_pattern_workflow(description)
+            if self.mistral_client and self.speculative_k > 1 and on_node is None:
+                return self._run_on_loop(self._generate_speculative_async(description, use_cache=use_cache, model=model))
             if self.mistral_client:
-                return self._generate_ai_workflow(description)
+                return self._generate_ai_workflow(description, use_cache=use_cache, on_node=on_node, model=model)
             else:
                 return self._generate_pattern_workflow(description)
         except Exception as e:
             print(f"⚠️ Error in workflow generation: {e}")
             return self._generate_fallback_workflow(description)
+        finally:
+            self._end_route(decision, route_token, start)
+            self._record_path("generated", started)
     
-    def _generate_ai_workflow(self, description: str) -> Dict[str, Any]:
-        from mistralai import Mistral
+    async def generate_workflow_async(self, description: str, use_cache: bool = True,
+                                      on_node: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Async variant of generate_workflow_from_description; many can run concurrently on one loop"""
+        print(f"🤖 Generating workflow for: {description}")
+        hits_token = _library_hits.set({})
+        try:
+            return await self._generate_workflow_async(description, use_cache, on_node, timeout)
+        finally:
+            _library_hits.reset(hits_token)
+    
+    async def _generate_workflow_async(self, description: str, use_cache: bool,
+                                       on_node: Optional[Callable[[Dict[str, Any]], None]],
+                                       timeout: Optional[float]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        # The ChromaDB search (and the optional template edit) block; keep them off the event loop
+        template_workflow = await self._run_blocking(self._generate_from_template, description, on_node)
+        if template_workflow is not None:
+            self._record_path("template", started)
+            return template_workflow
+        
+        if self.router is not None and self.retriever is not None and self.mistral_client:
+            # Fill this generation's library hits in the executor so routing doesn't search on the loop
+            try:
+                await self._run_blocking(self._search_library, description, TEMPLATE_CANDIDATES)
+            except Exception:
+                pass
+        decision, route_token, start = self._begin_route(description)
+        model = decision["model"] if decision else None
+        
+        try:
+            if decision is not None and decision["tier"] == TIER_PATTERN:
+                return self._generate_pattern_workflow(description)
+            if self.mistral_client and self.speculative_k > 1 and on_node is None:
+                return await self._generate_speculative_async(description, use_cache=use_cache, timeout=timeout,
+                                                              model=model)
+            if self.mistral_client:
+                return await self._generate_ai_workflow_async(description, use_cache, on_node, timeout, model=model)
+            else:
+                return self._generate_pattern_workflow(description)
+        except Exception as e:
+            print(f"⚠️ Error in workflow generation: {e}")
+            return self._generate_fallback_workflow(description)
+        finally:
+            self._end_route(decision, route_token, start)
+            self._record_path("generated", started)
+    
+    @staticmethod
+    async def _run_blocking(func: Callable, *args):
+        """Run a blocking call in the default executor, inside the calling task's context"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, contextvars.copy_context().run, func, *args)
+    
+    async def generate_many_async(self, descriptions: List[str], concurrency: int = 4,
+                                  timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Generate workflows for several descriptions with at most `concurrency` model calls in flight"""
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def run(description: str) -> Dict[str, Any]:
+            async with semaphore:
+                return await self.generate_workflow_async(description, timeout=timeout)
+        
+        return await asyncio.gather(*(run(description) for description in descriptions))
+    
+    # --- template-first fast path -------------------------------------------------------
+    
+    def _find_template(self, description: str) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """(closest hit, stored export) when the top ChromaDB hit clears the template threshold"""
+        if self.template_threshold is None or self.retriever is None or self.skeleton_store is None:
+            return None
+        try:
+            hits = self._search_library(description, TEMPLATE_CANDIDATES)
+        except Exception as e:
+            print(f"⚠️ Template lookup failed: {e}")
+            return None
+        # Hybrid hits are in fused-rank order, so the first one isn't necessarily the most similar
+        best = max(hits, key=lambda hit: hit.get('similarity', 0.0), default=None)
+        if best is None or best.get('similarity', 0.0) < self.template_threshold:
+            return None
+        template = self.skeleton_store.load_workflow(best.get('source_file', ''))
+        return (best, template) if template is not None else None
+    
+    def _generate_from_template(self, description: str,
+                                on_node: Optional[Callable[[Dict[str, Any]], None]] = None) -> Optional[Dict[str, Any]]:
+        """Clone the closest stored workflow and adapt it; None sends the request to full generation"""
+        found = self._find_template(description)
+        if found is None:
+            return None
+        hit, template = found
+        print(f"📎 Adapting stored workflow '{hit.get('title')}' (similarity {hit.get('similarity', 0):.2f})")
+        
+        workflow = self._fill_template(template, description)
+        if self.template_llm_edit and self.mistral_client:
+            try:
+                self._apply_template_edit(workflow, self._request_template_edit(workflow, description))
+            except Exception as e:
+                print(f"⚠️ Template edit failed, keeping deterministic fill: {e}")
+        
+        workflow = self._enhance_workflow(workflow, description)
+        workflow['meta']['template'] = hit.get('source_file', '')
+        validation = self.validate_workflow(workflow)
+        if not validation['valid']:
+            print(f"⚠️ Adapted template invalid ({', '.join(validation['errors'][:3])}); generating instead")
+            return None
+        if on_node is not None:
+            for node in workflow['nodes']:
+                on_node(node)
+        return workflow
+    
+    def _fill_template(self, template: Dict[str, Any], description: str) -> Dict[str, Any]:
+        """Deterministic adaptation: fresh ids, new name, webhook paths derived from the description
+        
+        Adapts `template` in place; SkeletonStore.load_workflow already returns a private copy.
+        """
+        workflow = template
+        slug = re.sub(r'[^a-z0-9]+', '-', description.lower()).strip('-')[:40] or "workflow"
+        paths = set()
+        for node in workflow.get('nodes', []):
+            node['id'] = str(uuid.uuid4())
+            if 'webhookId' in node:
+                node['webhookId'] = str(uuid.uuid4())
+            if node.get('type', '').endswith('.webhook') and 'path' in node.get('parameters', {}):
+                # One path per webhook node: slug + node name, numbered if two names slugify alike
+                base = f"{slug}-{re.sub(r'[^a-z0-9]+', '-', node.get('name', '').lower()).strip('-') or 'webhook'}"
+                path, n = base, 2
+                while path in paths:
+                    path, n = f"{base}-{n}", n + 1
+                paths.add(path)
+                node['parameters']['path'] = path
+            # Credential ids belong to the template's n8n instance; keep only the names as a hint
+            for credential in node.get('credentials', {}).values():
+                if isinstance(credential, dict):
+                    credential.pop('id', None)
+        workflow.pop('pinData', None)
+        workflow.update({
+            "id": str(uuid.uuid4()),
+            "name": self._generate_workflow_name(description),
+            "active": False,
+            "tags": [],
+            "versionId": str(uuid.uuid4())
+        })
+        return workflow
+    
+    def _request_template_edit(self, workflow: Dict[str, Any], description: str) -> Dict[str, Any]:
+        """Ask the model for a small JSON patch (renames, parameter values) instead of a whole workflow"""
+        lines = []
+        for node in workflow.get('nodes', []):
+            editable = {
+                key: value for key, value in node.get('parameters', {}).items()
+                if isinstance(value, (str, int, float)) and len(str(value)) <= 80
+            }
+            lines.append(f"- {node['name']} [{node.get('type', '').split('.')[-1]}] {json.dumps(editable)}")
+        
+        prompt = f"""Adapt this existing n8n workflow to the request with as few changes as possible.
+
+REQUEST: "{description}"
+
+NODES (name [type] editable parameters):
+{chr(10).join(lines)}
+
+Return ONLY JSON of the form:
+{{"name": "Workflow name", "rename_nodes": {{"Old name": "New name"}}, "parameters": {{"Node name": {{"param": "value"}}}}}}
+"""
+        start = time.perf_counter()
+        response = self.mistral_client.chat.complete(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": "You edit n8n workflows. Return only valid JSON - no markdown, no explanations"},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.1,
+            max_tokens=800,
+            timeout_ms=int(self.timeout * 1000)
+        )
+        self._record_call("template_edit", start, usage=response.usage)
+        return self._parse_ai_response(response.choices[0].message.content.strip())
+    
+    @staticmethod
+    def _apply_template_edit(workflow: Dict[str, Any], patch: Dict[str, Any]):
+        """Apply a model-proposed patch, ignoring anything that doesn't refer to an existing node"""
+        if isinstance(patch.get('name'), str) and patch['name'].strip():
+            workflow['name'] = patch['name'].strip()
+        
+        nodes = {node['name']: node for node in workflow.get('nodes', [])}
+        renames = {
+            old: new for old, new in (patch.get('rename_nodes') or {}).items()
+            if old in nodes and isinstance(new, str) and new and new not in nodes
+        }
+        if len(set(renames.values())) != len(renames):
+            renames = {}
+        
+        for node_name, params in (patch.get('parameters') or {}).items():
+            node = nodes.get(node_name) or next(
+                (nodes[old] for old, new in renames.items() if new == node_name), None
+            )
+            if node is not None and isinstance(params, dict):
+                node.setdefault('parameters', {}).update(
+                    {key: value for key, value in params.items() if isinstance(value, (str, int, float, bool))}
+                )
+        
+        if renames:
+            for old, new in renames.items():
+                nodes[old]['name'] = new
+            connections = {}
+            for source, outputs in workflow.get('connections', {}).items():
+                for output_type in outputs.values():
+                    for group in output_type:
+                        for link in group or []:
+                            link['node'] = renames.get(link.get('node'), link.get('node'))
+                connections[renames.get(source, source)] = outputs
+            workflow['connections'] = connections
+    
+    def _record_path(self, path: str, start: float):
+        self.path_latencies[path].append(time.perf_counter() - start)
+    
+    def get_path_stats(self) -> Dict[str, Any]:
+        """Latency of template-adapted vs fully generated workflows, for tuning template_threshold"""
+        stats = {"template_threshold": self.template_threshold}
+        for path, latencies in self.path_latencies.items():
+            values = sorted(latencies)
+            stats[path] = {
+                "requests": len(values),
+                "avg_latency": sum(values) / len(values) if values else None,
+                "p50_latency": values[len(values) // 2] if values else None,
+                "p95_latency": values[min(len(values) - 1, int(len(values) * 0.95))] if values else None
+            }
+        return stats
+    
+    def _search_library(self, description: str, n_results: int) -> List[Dict[str, Any]]:
+        """Closest stored workflows, queried once per generation and shared by its consumers"""
+        memo = _library_hits.get()
+        if memo is not None and description in memo:
+            return memo[description][:n_results]
+        hits = self.retriever.search_similar_workflows(description, n_results=max(n_results, self.few_shot_k, 1))
+        if memo is not None:
+            memo[description] = hits
+        return hits[:n_results]
+    
+    def _begin_route(self, description: str):
+        """Route the request (if a router is configured) and make the decision visible to model calls"""
+        if self.router is None or not self.mistral_client:
+            return None, None, None
+        nearest_hits = None
+        if self.retriever is not None:
+            try:
+                nearest_hits = self._search_library(description, TEMPLATE_CANDIDATES)
+            except Exception:
+                pass
+        decision = self.router.route(description, self._analyze_description(description), nearest_hits)
+        return decision, _active_route.set(decision), time.perf_counter()
+    
+    def _end_route(self, decision: Optional[Dict[str, Any]], route_token, start: Optional[float]):
+        if decision is None:
+            return
+        self.router.record_outcome(decision, time.perf_counter() - start)
+        _active_route.reset(route_token)
+    
+    def get_routing_stats(self) -> Dict[str, Any]:
+        """Routing decisions per tier with their latency and estimated cost"""
+        if self.router is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.router.get_stats()}
+    
+    def _run_on_loop(self, coro):
+        """Run a coroutine on the generator's background event loop and wait for its result"""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="generator-loop", daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def close(self):
+        """Stop the background event loop used by speculative generation"""
+        with self._loop_lock:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+    
+    def _speculative_variants(self, model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """K (model, temperature) variants: temperatures spread around the base one
+        
+        A routed model is used for every variant so the cache key and routing costs describe what ran;
+        without one, the variants rotate through speculative_models (or the generator's model).
+        """
+        models = [model] if model else (self.speculative_models or [self.model])
+        variants = []
+        for i in range(self.speculative_k):
+            temperature = round(min(1.0, max(0.0, self.temperature + 0.2 * (i - (self.speculative_k - 1) / 2))), 2)
+            variants.append({"model": models[i % len(models)], "temperature": temperature})
+        return variants
+    
+    async def _generate_speculative_async(self, description: str, use_cache: bool = True,
+                                          timeout: Optional[float] = None, model: Optional[str] = None) -> Dict[str, Any]:
+        """Run K generations concurrently; return the first one that passes validate_workflow
+        
+        Remaining calls are cancelled as soon as a winner is found. If every variant fails (or the
+        timeout expires) the pattern engine is used, as in the single-call path.
+        """
+        # Cached under the base temperature and the models that may answer: "the answer for this configuration"
+        examples = await self._run_blocking(self._retrieve_examples, description)
+        key_model = model or ("|".join(self.speculative_models) if self.speculative_models else None)
+        cache_key, cached = self._cached_generation(description, use_cache, None, key_model, examples)
+        if cached is not None:
+            return cached
+        
+        prompt = self._create_ai_prompt(description, examples)
+        timeout = self.timeout if timeout is None else timeout
+        variants = self._speculative_variants(model)
+        self.speculation_stats["runs"] += 1
+        
+        async def attempt(variant: Dict[str, Any]):
+            try:
+                return variant, await self._complete_ai_response_async(prompt, **variant), None
+            except Exception as e:
+                return variant, None, e
+        
+        tasks = [asyncio.create_task(attempt(variant)) for variant in variants]
+        start = time.perf_counter()
+        try:
+            for next_done in asyncio.as_completed(tasks, timeout=timeout):
+                variant, workflow_json_str, error = await next_done
+                label = f"{variant['model']}@{variant['temperature']}"
+                if error is not None:
+                    print(f"⚠️ Speculative variant {label} failed: {error}")
+                    continue
+                try:
+                    workflow_json = self._parse_ai_response(workflow_json_str)
+                except json.JSONDecodeError:
+                    continue
+                
+                candidate = self._enhance_workflow(json.loads(json.dumps(workflow_json)), description)
+                validation = self.validate_workflow(candidate)
+                if not validation["valid"]:
+                    print(f"⚠️ Speculative variant {label} invalid: {', '.join(validation['errors'][:3])}")
+                    continue
+                
+                wins = self.speculation_stats["wins"]
+                wins[label] = wins.get(label, 0) + 1
+                print(f"🏁 Speculative winner {label} after {time.perf_counter() - start:.2f}s")
+                if cache_key is not None:
+                    self.generation_cache.set(cache_key, workflow_json)
+                return candidate
+        except asyncio.TimeoutError:
+            print(f"⏱️ Speculative generation timed out after {timeout}s")
+        finally:
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            self.speculation_stats["calls_cancelled"] += len(pending)
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        self.speculation_stats["all_failed"] += 1
+        return self._generate_pattern_workflow(description)
+    
+    def _cached_generation(self, description: str, use_cache: bool,
+                           on_node: Optional[Callable[[Dict[str, Any]], None]],
+                           model: Optional[str] = None,
+                           examples: Optional[List[str]] = None) -> Tuple[Optional[str], Optional[Dict]]:
+        """Return (cache key, cached workflow or None)"""
+        if not use_cache or self.generation_cache is None:
+            return None, None
+        cache_key = GenerationCache.make_key(description, model or self.model, self.temperature,
+                                             self.registry_version, examples)
+        cached = self.generation_cache.get(cache_key)
+        if cached is None:
+            return cache_key, None
+        print("⚡ Using cached generation")
+        if on_node is not None:
+            for node in cached.get('nodes', []):
+                on_node(node)
+        return cache_key, self._enhance_workflow(cached, description)
+    
+    def _finish_generation(self, workflow_json_str: str, description: str, cache_key: Optional[str]) -> Dict[str, Any]:
+        """Parse the model output, add metadata and cache it if it validates"""
+        workflow_json = self._parse_ai_response(workflow_json_str)
+        
+        # Enhance a copy: only what the model produced is cached, meta is regenerated on every hit
+        workflow = self._enhance_workflow(json.loads(json.dumps(workflow_json)), description)
+        validation = self.validate_workflow(workflow)
+        if not validation["valid"]:
+            print(f"⚠️ Generated workflow not cached: {', '.join(validation['errors'][:3])}")
+        elif cache_key is not None:
+            self.generation_cache.set(cache_key, workflow_json)
+        return workflow
+    
+    def _generate_ai_workflow(self, description: str, use_cache: bool = True,
+                              on_node: Optional[Callable[[Dict[str, Any]], None]] = None,
+                              model: Optional[str] = None) -> Dict[str, Any]:
         """Generate workflow using AI"""
-        from mistralai.models import ChatMessage
+        examples = self._retrieve_examples(description)
+        cache_key, cached = self._cached_generation(description, use_cache, on_node, model, examples)
+        if cached is not None:
+            return cached
         
         # Create comprehensive AI prompt
-        prompt = self._create_ai_prompt(description)
+        prompt = self._create_ai_prompt(description, examples)
         
         try:
-            messages = [
-                ChatMessage(role="system", content=self._get_system_prompt()),
-                ChatMessage(role="user", content=prompt)
-            ]
-            
-            response = self.mistral_client.chat(
-                model="mistral-large-latest",
-                messages=messages,
-                temperature=0.3,
-                max_tokens=6000
-            )
-            
-            # Parse AI response
-            workflow_json_str = response.choices[0].message.content.strip()
-            workflow_json = self._parse_ai_response(workflow_json_str)
+            if on_node is not None:
+                workflow_json_str = self._stream_ai_response(prompt, on_node, model)
+            else:
+                workflow_json_str = self._complete_ai_response(prompt, model)
+            return self._finish_generation(workflow_json_str, description, cache_key)
             
-            # Enhance and validate
-            workflow_json = self._enhance_workflow(workflow_json, description)
-            return workflow_json
+        except Exception as e:
+            print(f"❌ AI generation failed: {e}")
+            return self._generate_pattern_workflow(description)
+    
+    async def _generate_ai_workflow_async(self, description: str, use_cache: bool = True,
+                                          on_node: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                          timeout: Optional[float] = None, model: Optional[str] = None) -> Dict[str, Any]:
+        """Generate workflow using AI without blocking the event loop
+        
+        The model call is bounded by `timeout` (default: the generator's timeout); cancelling the
+        awaiting task cancels the HTTP request as well.
+        """
+        examples = await self._run_blocking(self._retrieve_examples, description)
+        cache_key, cached = self._cached_generation(description, use_cache, on_node, model, examples)
+        if cached is not None:
+            return cached
+        
+        prompt = self._create_ai_prompt(description, examples)
+        timeout = self.timeout if timeout is None else timeout
+        
+        try:
+            if on_node is not None:
+                call = self._stream_ai_response_async(prompt, on_node, model)
+            else:
+                call = self._complete_ai_response_async(prompt, model)
+            workflow_json_str = await asyncio.wait_for(call, timeout)
+            return self._finish_generation(workflow_json_str, description, cache_key)
             
+        except asyncio.TimeoutError:
+            print(f"⏱️ AI generation timed out after {timeout}s")
+            return self._generate_pattern_workflow(description)
         except Exception as e:
             print(f"❌ AI generation failed: {e}")
             return self._generate_pattern_workflow(description)
     
-    def _create_ai_prompt(self, description: str) -> str:
-        """Create comprehensive AI prompt for workflow generation"""
+    # --- model calls ---------------------------------------------------------------------
+    
+    def _build_messages(self, prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": self._get_prompt_parts()["system"]},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _request_args(self, prompt: str, model: Optional[str] = None,
+                      temperature: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            "model": model or self.model,
+            "messages": self._build_messages(prompt),
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_tokens": self.max_tokens,
+            "timeout_ms": int(self.timeout * 1000)
+        }
+    
+    def _record_call(self, mode: str, start: float, usage=None, status: str = "ok", model: Optional[str] = None):
+        """Record latency and token usage of one model call"""
+        record = {
+            "model": model or self.model,
+            "mode": mode,
+            "status": status,
+            "latency": time.perf_counter() - start,
+            "prompt_tokens": getattr(usage, "prompt_tokens", None),
+            "completion_tokens": getattr(usage, "completion_tokens", None)
+        }
+        with self._metrics_lock:
+            self.call_metrics.append(record)
+            decision = _active_route.get()
+            if decision is not None:
+                decision["calls"] += 1
+                decision["prompt_tokens"] += record["prompt_tokens"] or 0
+                decision["completion_tokens"] += record["completion_tokens"] or 0
+        return record
+    
+    def _complete_ai_response(self, prompt: str, model: Optional[str] = None) -> str:
+        """Blocking chat completion"""
+        start = time.perf_counter()
+        try:
+            response = self.mistral_client.chat.complete(**self._request_args(prompt, model))
+        except Exception:
+            self._record_call("complete", start, status="error", model=model)
+            raise
+        self._record_call("complete", start, usage=response.usage, model=model)
+        return response.choices[0].message.content.strip()
+    
+    async def _complete_ai_response_async(self, prompt: str, model: Optional[str] = None,
+                                          temperature: Optional[float] = None) -> str:
+        """Chat completion on the event loop"""
+        start = time.perf_counter()
+        try:
+            response = await self.mistral_client.chat.complete_async(**self._request_args(prompt, model, temperature))
+        except asyncio.CancelledError:
+            self._record_call("complete_async", start, status="cancelled", model=model)
+            raise
+        except Exception:
+            self._record_call("complete_async", start, status="error", model=model)
+            raise
+        self._record_call("complete_async", start, usage=response.usage, model=model)
+        return response.choices[0].message.content.strip()
+    
+    def _consume_stream_event(self, event, parser: IncrementalWorkflowParser, stats: Dict[str, Any], start: float,
+                              on_node: Callable[[Dict[str, Any]], None]) -> bool:
+        """Feed one stream event to the parser; returns True once the workflow JSON is complete"""
+        if getattr(event.data, "usage", None) is not None:
+            stats["usage"] = event.data.usage
+        delta = event.data.choices[0].delta.content if event.data.choices else None
+        if not delta:
+            return False
+        for node in parser.feed(delta):
+            if stats["time_to_first_node"] is None:
+                stats["time_to_first_node"] = time.perf_counter() - start
+            stats["nodes"] += 1
+            on_node(node)
+        # Anything after the closing brace is a fence or chatter
+        return parser.complete
+    
+    def _finish_stream(self, mode: str, parser: IncrementalWorkflowParser, stats: Dict[str, Any], start: float,
+                       error: Optional[BaseException], model: Optional[str] = None):
+        stats["chars"] = len(parser.text)
+        stats["total_time"] = time.perf_counter() - start
+        if isinstance(error, MalformedStreamError):
+            stats["aborted"] = True
+            print(f"🛑 Aborting malformed stream: {error}")
+        status = "ok" if error is None else "cancelled" if isinstance(error, asyncio.CancelledError) else "error"
+        self._record_call(mode, start, usage=stats.pop("usage", None), status=status, model=model)
+    
+    def _new_stream_stats(self) -> Dict[str, Any]:
+        stats = {"time_to_first_node": None, "total_time": None, "nodes": 0, "chars": 0, "aborted": False}
+        self.last_stream_stats = stats
+        return stats
+    
+    def _stream_ai_response(self, prompt: str, on_node: Callable[[Dict[str, Any]], None],
+                            model: Optional[str] = None) -> str:
+        """Stream the model response, emitting nodes as they complete and aborting on malformed output"""
+        parser = IncrementalWorkflowParser()
+        stats = self._new_stream_stats()
+        start = time.perf_counter()
+        error = None
+        
+        # Leaving the with-block closes the HTTP stream, so an aborted response is never finished
+        try:
+            with self.mistral_client.chat.stream(**self._request_args(prompt, model)) as events:
+                for event in events:
+                    if self._consume_stream_event(event, parser, stats, start, on_node):
+                        break
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish_stream("stream", parser, stats, start, error, model)
+        
+        print(f"📡 Streamed {stats['nodes']} nodes in {stats['total_time']:.2f}s "
+              f"(first node after {stats['time_to_first_node'] or 0:.2f}s)")
+        return parser.finish()
+    
+    async def _stream_ai_response_async(self, prompt: str, on_node: Callable[[Dict[str, Any]], None],
+                                        model: Optional[str] = None) -> str:
+        """Async streaming counterpart of _stream_ai_response"""
+        parser = IncrementalWorkflowParser()
+        stats = self._new_stream_stats()
+        start = time.perf_counter()
+        error = None
+        
+        try:
+            async with await self.mistral_client.chat.stream_async(**self._request_args(prompt, model)) as events:
+                async for event in events:
+                    if self._consume_stream_event(event, parser, stats, start, on_node):
+                        break
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._finish_stream("stream_async", parser, stats, start, error, model)
+        
+        print(f"📡 Streamed {stats['nodes']} nodes in {stats['total_time']:.2f}s "
+              f"(first node after {stats['time_to_first_node'] or 0:.2f}s)")
+        return parser.finish()
+    
+    def get_call_metrics(self) -> Dict[str, Any]:
+        """Latency and token usage summary over recent model calls"""
+        with self._metrics_lock:
+            calls = list(self.call_metrics)
+        latencies = sorted(call["latency"] for call in calls if call["status"] == "ok")
+        return {
+            "calls": len(calls),
+            "errors": sum(1 for call in calls if call["status"] == "error"),
+            "cancelled": sum(1 for call in calls if call["status"] == "cancelled"),
+            "avg_latency": sum(latencies) / len(latencies) if latencies else None,
+            "p95_latency": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            "prompt_tokens": sum(call["prompt_tokens"] or 0 for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] or 0 for call in calls),
+            "speculation": dict(self.speculation_stats),
+            "recent": calls[-10:]
+        }
+    
+    def _create_ai_prompt(self, description: str, examples: Optional[List[str]] = None) -> str:
+        """Create comprehensive AI prompt for workflow generation (static prefix + per-request suffix)"""
+        return self._get_prompt_parts()["prefix"] + self._create_prompt_suffix(description, examples)
+    
+    def _retrieve_examples(self, description: str) -> List[str]:
+        """Skeletons of the stored workflows most similar to the description"""
+        if self.retriever is None or self.skeleton_store is None or self.few_shot_k <= 0:
+            return []
+        try:
+            hits = self._search_library(description, self.few_shot_k)
+        except Exception as e:
+            print(f"⚠️ Few-shot retrieval failed: {e}")
+            return []
+        
+        examples, titles = [], []
+        for hit in hits:
+            if hit.get('similarity', 0.0) < self.few_shot_min_similarity:
+                continue
+            skeleton = self.skeleton_store.get(hit.get('source_file', ''))
+            if skeleton and skeleton not in examples:
+                examples.append(skeleton)
+                titles.append(hit.get('title', ''))
+        self.last_retrieval = {"titles": titles, "tokens": sum(estimate_tokens(e) for e in examples)}
+        return examples
+    
+    def _create_prompt_suffix(self, description: str, examples: Optional[List[str]] = None) -> str:
+        """The only part of the prompt that changes between requests"""
+        if examples is None:
+            examples = self._retrieve_examples(description)
+        few_shot = ""
+        if examples:
+            few_shot = "\nSIMILAR WORKING WORKFLOWS FROM OUR LIBRARY (follow their structure where it fits):\n"
+            few_shot += "\n\n".join(examples) + "\n"
+        return f"""{few_shot}
+WORKFLOW TO GENERATE: "{description}"
+
+Generate the workflow now:
+"""
+    
+    def _get_prompt_parts(self) -> Dict[str, Any]:
+        """System prompt and static user-prompt prefix, memoized per registry version
+        
+        Keeping everything request-independent (rules, node catalog, JSON skeleton, examples) at the
+        front, byte-identical across calls, lets provider-side prefix caching hit.
+        """
+        version = self.registry_version
+        parts = _PROMPT_CACHE.get(version)
+        if parts is None:
+            with _PROMPT_CACHE_LOCK:
+                parts = _PROMPT_CACHE.get(version)
+                if parts is None:
+                    system = self._get_system_prompt()
+                    prefix = self._create_prompt_prefix()
+                    parts = {
+                        "system": system,
+                        "prefix": prefix,
+                        "system_tokens": estimate_tokens(system),
+                        "prefix_tokens": estimate_tokens(prefix)
+                    }
+                    _PROMPT_CACHE[version] = parts
+        return parts
+    
+    def _create_prompt_prefix(self) -> str:
+        """Request-independent part of the user prompt"""
         node_types = "\n".join([
             f"- {name}: {info['type']} - {info['description']}"
             for name, info in self.node_registry.items()
         ])
         
         return f"""
-Generate a complete n8n workflow JSON for: "{description}"
+Generate a complete n8n workflow JSON for the request at the end of this message.
 
 REQUIREMENTS:
 1. Create 4-8 interconnected nodes for a realistic workflow
@@ -234,7 +859,6 @@ WORKFLOW STRUCTURE:
     "staticData": {{}},
     "tags": [],
     "triggerCount": 1,
-    "updatedAt": "{datetime.now().isoformat()}",
     "versionId": "unique-version-id"
 }}
 
@@ -242,10 +866,30 @@ EXAMPLES OF GOOD WORKFLOWS:
 - Lead Processing: webhook → function(scoring) → switch(route) → crm(create) → email(notify)
 - Content Approval: webhook → function(validate) → slack(notify) → wait → switch(approved) → http_request(publish)
 - Data Sync: schedule → http_request(fetch) → function(transform) → google_sheets(update) → email(report)
-
-Generate the workflow now:
 """
     
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Generation cache statistics (hit rate, entries)"""
+        if self.generation_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.generation_cache.stats()}
+    
+    def get_prompt_stats(self, description: Optional[str] = None) -> Dict[str, Any]:
+        """Estimated prompt size: cached static tokens, plus the dynamic suffix for a description"""
+        parts = self._get_prompt_parts()
+        stats = {
+            "registry_version": self.registry_version,
+            "system_tokens": parts["system_tokens"],
+            "prefix_tokens": parts["prefix_tokens"],
+            "static_tokens": parts["system_tokens"] + parts["prefix_tokens"]
+        }
+        if description is not None:
+            suffix_tokens = estimate_tokens(self._create_prompt_suffix(description))
+            stats["suffix_tokens"] = suffix_tokens
+            stats["total_tokens"] = stats["static_tokens"] + suffix_tokens
+            stats["static_ratio"] = stats["static_tokens"] / stats["total_tokens"]
+        return stats
+    
     def _get_system_prompt(self) -> str:
         """Get system prompt for AI"""
         return """You are an expert n8n workflow architect. You create functional, realistic automation workflows.
@@ -266,44 +910,32 @@ RULES:
         keywords = self._analyze_description(description)
         
         # Select appropriate workflow pattern
-        pattern = self._select_workflow_pattern(keywords)
+        selected = self.registry.select_pattern(keywords)
+        pattern = list(selected["nodes"])
         
         # Generate nodes based on pattern
         nodes = self._generate_nodes_from_pattern(pattern, keywords, description)
         
         # Create connections
-        connections = self._create_connections(nodes)
+        connections = self._create_connections(nodes, selected.get("branches"))
+        
+        # Lay nodes out by graph layer so branches stack instead of overlapping
+        apply_layout(nodes, connections)
         
         # Build complete workflow
         return self._build_workflow(description, nodes, connections)
     
     def _analyze_description(self, description: str) -> Dict[str, List[str]]:
         """Analyze description for workflow components"""
-        desc_lower = description.lower()
-        
-        return {
-            "triggers": [word for word in ["form", "webhook", "schedule", "manual", "email"] if word in desc_lower],
-            "actions": [word for word in ["email", "slack", "api", "database", "crm"] if word in desc_lower],
-            "logic": [word for word in ["if", "condition", "approve", "route", "check"] if word in desc_lower],
-            "integrations": [word for word in ["hubspot", "salesforce", "sheets", "slack"] if word in desc_lower],
-            "data": [word for word in ["process", "transform", "validate", "score"] if word in desc_lower]
-        }
+        return select_groups(analyze_keywords(description), PATTERN_GROUPS)
     
     def _select_workflow_pattern(self, keywords: Dict[str, List[str]]) -> List[str]:
         """Select workflow pattern based on keywords"""
-        if keywords["logic"] and keywords["integrations"]:
-            return ["webhook", "function", "switch", "crm", "email"]
-        elif keywords["data"] and keywords["actions"]:
-            return ["webhook", "function", "http_request", "email"]
-        elif "approve" in " ".join(keywords["logic"]):
-            return ["webhook", "function", "slack", "wait", "switch", "email"]
-        else:
-            return ["webhook", "function", "email"]
+        return list(self.registry.select_pattern(keywords)["nodes"])
     
     def _generate_nodes_from_pattern(self, pattern: List[str], keywords: Dict, description: str) -> List[Dict]:
-        """Generate nodes based on pattern"""
+        """Generate nodes based on pattern (positioned later by apply_layout)"""
         nodes = []
-        x_position = 240
         
         for i, node_type in enumerate(pattern):
             node_name = self._generate_node_name(node_type, i, keywords)
@@ -312,12 +944,11 @@ RULES:
             node = self._create_node(
                 node_type=node_type,
                 name=node_name,
-                position=[x_position, 300],
+                position=list(ORIGIN),
                 config=node_config
             )
             
             nodes.append(node)
-            x_position += 200
         
         return nodes
     
@@ -450,19 +1081,9 @@ return items.map(item => ({
         }
         return cred_mapping.get(node_type, {})
     
-    def _create_connections(self, nodes: List[Dict]) -> Dict:
-        """Create connections between nodes"""
-        connections = {}
-        
-        for i in range(len(nodes) - 1):
-            current_node = nodes[i]["name"]
-            next_node = nodes[i + 1]["name"]
-            
-            connections[current_node] = {
-                "main": [[{"node": next_node, "type": "main", "index": 0}]]
-            }
-        
-        return connections
+    def _create_connections(self, nodes: List[Dict], branches: Optional[List[Dict]] = None) -> Dict:
+        """Create connections between nodes; if/switch nodes fan out only where the pattern declares branches"""
+        return chain_connections(nodes, branches)
     
     def _build_workflow(self, description: str, nodes: List[Dict], connections: Dict) -> Dict[str, Any]:
         """Build complete workflow structure"""
@@ -533,6 +1154,10 @@ return items.map(item => ({
             if 'id' not in node:
                 node['id'] = str(uuid.uuid4())
         
+        # Large model outputs often stack nodes on top of each other; re-layout those
+        if has_overlaps(workflow.get('nodes', [])):
+            apply_layout(workflow['nodes'], workflow.get('connections', {}))
+        
         return workflow
     
     def _generate_fallback_workflow(self, description: str) -> Dict[str, Any]:
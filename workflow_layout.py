@@ -0,0 +1,203 @@
+import time
+from collections import defaultdict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# Default canvas geometry (n8n positions are [x, y] in pixels, x grows left to right)
+ORIGIN = (240, 300)
+LAYER_SPACING = 220
+NODE_SPACING = 160
+
+# Nodes that annotate the canvas instead of taking part in the flow
+UNLAID_TYPES = frozenset({"n8n-nodes-base.stickyNote"})
+
+
+def chain_connections(nodes: List[Dict[str, Any]], branches: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Connect an ordered node list; each node feeds the next one unless a branch is declared
+
+    A branch {"node": i, "outputs": [[j, ...], [k, ...]]} sends output n of node i through the
+    n-th run of node indices (an empty run goes straight to the join). The runs cover the nodes
+    right after i and each one rejoins the first node after them.
+    """
+    branch_at = {branch["node"]: branch["outputs"] for branch in branches or []}
+    connections: Dict[str, Any] = {}
+
+    def link(source: int, targets: List[Optional[int]]):
+        connections[nodes[source]["name"]] = {
+            "main": [[{"node": nodes[target]["name"], "type": "main", "index": 0}] if target is not None else []
+                     for target in targets]
+        }
+
+    i = 0
+    while i < len(nodes) - 1:
+        runs = branch_at.get(i)
+        if runs is None:
+            link(i, [i + 1])
+            i += 1
+            continue
+        join = max([i] + [index for run in runs for index in run]) + 1
+        join_target = join if join < len(nodes) else None
+        link(i, [run[0] if run else join_target for run in runs])
+        for run in runs:
+            for source, target in zip(run, run[1:]):
+                link(source, [target])
+            if run and join_target is not None:
+                link(run[-1], [join_target])
+        i = join
+    return connections
+
+
+def _edges(connections: Dict[str, Any], names: set) -> List[Tuple[str, str]]:
+    """(source, target) pairs over every connection type between laid-out nodes"""
+    edges = []
+    for source, outputs in connections.items():
+        if source not in names:
+            continue
+        for groups in outputs.values():
+            for group in groups or []:
+                for link in group or []:
+                    if link.get("node") in names:
+                        edges.append((source, link["node"]))
+    return edges
+
+
+def _acyclic(order: List[str], edges: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Reverse the back edges found by an iterative DFS so layering sees a DAG"""
+    successors = defaultdict(list)
+    for source, target in edges:
+        successors[source].append(target)
+    state: Dict[str, int] = {}  # 1 = on the DFS stack, 2 = finished
+    back_edges = set()
+    for root in order:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state.get(child) == 1:
+                    back_edges.add((node, child))
+                elif child not in state:
+                    state[child] = 1
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                state[node] = 2
+                stack.pop()
+    return [(target, source) if (source, target) in back_edges else (source, target) for source, target in edges]
+
+
+def _layers(order: List[str], edges: List[Tuple[str, str]]) -> Dict[str, int]:
+    """Longest-path layering via Kahn's topological sort"""
+    successors = defaultdict(list)
+    indegree = {name: 0 for name in order}
+    for source, target in edges:
+        if source != target:
+            successors[source].append(target)
+            indegree[target] += 1
+    layer = {name: 0 for name in order}
+    queue = deque(name for name in order if indegree[name] == 0)
+    while queue:
+        node = queue.popleft()
+        for child in successors[node]:
+            layer[child] = max(layer[child], layer[node] + 1)
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                queue.append(child)
+    return layer
+
+
+def _order_layers(order: List[str], edges: List[Tuple[str, str]], layer: Dict[str, int],
+                  sweeps: int = 2) -> List[List[str]]:
+    """Group nodes by layer and reduce crossings with barycenter sweeps (down, then up)"""
+    rows: List[List[str]] = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for name in order:
+        rows[layer[name]].append(name)
+
+    predecessors, successors = defaultdict(list), defaultdict(list)
+    for source, target in edges:
+        if layer[source] < layer[target]:
+            predecessors[target].append(source)
+            successors[source].append(target)
+
+    for _ in range(sweeps):
+        for neighbours, layer_indices in ((predecessors, range(1, len(rows))),
+                                          (successors, range(len(rows) - 2, -1, -1))):
+            for index in layer_indices:
+                adjacent_row = rows[index - 1] if neighbours is predecessors else rows[index + 1]
+                rank = {name: i for i, name in enumerate(adjacent_row)}
+                row = rows[index]
+
+                def barycenter(item: Tuple[int, str]) -> float:
+                    position, name = item
+                    linked = [rank[other] for other in neighbours[name] if other in rank]
+                    # Nodes without neighbours in the adjacent layer keep their current slot
+                    return sum(linked) / len(linked) if linked else position
+
+                rows[index] = [name for _, name in sorted(enumerate(row), key=barycenter)]
+    return rows
+
+
+def compute_layout(nodes: List[Dict[str, Any]], connections: Dict[str, Any], origin: Tuple[int, int] = ORIGIN,
+                   layer_spacing: int = LAYER_SPACING, node_spacing: int = NODE_SPACING) -> Dict[str, List[int]]:
+    """Layered (Sugiyama-style) positions by node name: cycle removal, longest-path layers,
+    barycenter crossing reduction, then each layer centred vertically on origin
+
+    Runs in O(V + E log E); sticky notes are left out and keep their positions.
+    """
+    order = [node["name"] for node in nodes if node.get("type") not in UNLAID_TYPES]
+    if not order:
+        return {}
+    names = set(order)
+    edges = _acyclic(order, _edges(connections, names))
+    rows = _order_layers(order, edges, _layers(order, edges))
+
+    positions = {}
+    for index, row in enumerate(rows):
+        top = origin[1] - (len(row) - 1) * node_spacing / 2
+        for slot, name in enumerate(row):
+            positions[name] = [int(origin[0] + index * layer_spacing), int(top + slot * node_spacing)]
+    return positions
+
+
+def apply_layout(nodes: List[Dict[str, Any]], connections: Dict[str, Any], **kwargs) -> List[Dict[str, Any]]:
+    """Write compute_layout() positions into the nodes (in place) and return them"""
+    positions = compute_layout(nodes, connections, **kwargs)
+    for node in nodes:
+        if node["name"] in positions:
+            node["position"] = positions[node["name"]]
+    return nodes
+
+
+def has_overlaps(nodes: List[Dict[str, Any]], min_distance: int = 100) -> bool:
+    """True when any node lacks a position or sits within min_distance of another (grid-bucketed, O(V))"""
+    cells: Dict[Tuple[int, int], List[Tuple[float, float]]] = defaultdict(list)
+    for node in nodes:
+        if node.get("type") in UNLAID_TYPES:
+            continue
+        position = node.get("position")
+        if not isinstance(position, (list, tuple)) or len(position) != 2:
+            return True
+        x, y = position
+        cell = (int(x // min_distance), int(y // min_distance))
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for other_x, other_y in cells.get((cell[0] + dx, cell[1] + dy), ()):
+                    if abs(other_x - x) < min_distance and abs(other_y - y) < min_distance:
+                        return True
+        cells[cell].append((x, y))
+    return False
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "Sun_Agent_IWO_.json"
+    with open(path, 'r', encoding='utf-8') as f:
+        workflow = json.load(f)
+    start = time.perf_counter()
+    positions = compute_layout(workflow["nodes"], workflow.get("connections", {}))
+    elapsed = (time.perf_counter() - start) * 1000
+    layers = len({x for x, _ in positions.values()})
+    print(f"✅ Laid out {len(positions)} nodes in {layers} layers in {elapsed:.2f} ms")
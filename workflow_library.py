@@ -0,0 +1,305 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import Dict, Any, List, Iterator, Optional, Tuple
+
+METADATA_FILE = "workflow_metadata.json"
+SKELETON_FILE = ".workflow_skeletons.json"
+
+# Node cap for few-shot skeletons; large exports are truncated to keep prompts small
+SKELETON_MAX_NODES = 20
+
+# Minimum token overlap for an n8n export to be linked to a metadata entry
+FILE_MATCH_THRESHOLD = 0.6
+
+
+def _tokenize_name(name: str) -> set:
+    """Split titles and file names (snake_case, CamelCase, punctuation) into lowercase tokens"""
+    # Keep unsplit words too so "GitHub" still matches "Github"
+    camel_split = re.sub(r'([a-z])([A-Z])', r'\1 \2', name)
+    return {token for text in (name, camel_split) for token in re.split(r'[^a-zA-Z0-9]+', text.lower()) if token}
+
+
+def slugify(title: str) -> str:
+    """Stable, readable id derived from a workflow title"""
+    return re.sub(r'[^a-z0-9]+', '-', title.lower()).strip('-') or "workflow"
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file's bytes in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(entry: Dict[str, Any], source_hash: str = "") -> str:
+    """Content hash of a catalog entry plus the hash of its linked n8n export (if any)"""
+    canonical = json.dumps(entry, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{canonical}\n{source_hash}".encode('utf-8')).hexdigest()
+
+
+def build_workflow_document(wf: Dict[str, Any], workflow_id: str, source_file: Optional[str] = None,
+                            entry_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """Build the searchable document text and ChromaDB metadata for one workflow"""
+    tags = wf.get('tags', [])
+    parameter_types = wf.get('parameter_types', [])
+    tags_str = ', '.join(tags) if isinstance(tags, list) else tags
+    params_str = ', '.join(parameter_types) if isinstance(parameter_types, list) else parameter_types
+
+    # Create searchable document text
+    document_text = f"""
+            Title: {wf.get('title', '')}
+            Description: {wf.get('description', '')}
+            Domain: {wf.get('domain', '')}
+            Tags: {tags_str}
+            Parameters: {params_str}
+            """.strip()
+
+    # FIX: Convert lists to strings for ChromaDB compatibility
+    metadata = {
+        'id': workflow_id,
+        'title': wf.get('title', ''),
+        'description': wf.get('description', ''),
+        'domain': wf.get('domain', ''),
+        'tags': tags_str,
+        'parameter_types': params_str
+    }
+
+    # Catalog bookkeeping used by incremental sync (ChromaDB metadata values can't be None)
+    if entry_hash:
+        metadata['source'] = 'catalog'
+        metadata['content_hash'] = entry_hash
+        metadata['source_file'] = os.path.basename(source_file) if source_file else ''
+    return document_text, metadata
+
+
+def iter_workflow_metadata(path: str = 'workflow_metadata.json', chunk_size: int = 65536) -> Iterator[Dict[str, Any]]:
+    """Incrementally yield entries of the workflows_metadata array without loading the whole file"""
+    decoder = json.JSONDecoder()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buffer, eof
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+                return False
+            buffer += chunk
+            return True
+
+        # Seek to the opening bracket of the workflows_metadata array
+        while True:
+            key_pos = buffer.find('"workflows_metadata"')
+            bracket_pos = buffer.find('[', key_pos) if key_pos != -1 else -1
+            if bracket_pos != -1:
+                buffer = buffer[bracket_pos + 1:]
+                break
+            if not fill():
+                raise ValueError(f"'workflows_metadata' array not found in {path}")
+
+        # Decode one array element at a time, reading more text only when needed
+        while True:
+            buffer = buffer.lstrip().lstrip(',').lstrip()
+            if buffer.startswith(']'):
+                return
+            try:
+                entry, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof or not fill():
+                    raise ValueError(f"Truncated workflows_metadata array in {path}")
+                continue
+            buffer = buffer[end:]
+            yield entry
+
+
+def discover_workflow_files(directory: str = ".") -> Dict[str, Dict[str, Any]]:
+    """Find n8n workflow exports (JSON files with a nodes array) in a directory"""
+    files = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json') or filename == METADATA_FILE:
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                workflow = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            continue
+        if not isinstance(workflow, dict) or not isinstance(workflow.get('nodes'), list):
+            continue
+
+        files[path] = {
+            'name': workflow.get('name', filename[:-5]),
+            'tokens': _tokenize_name(filename[:-5]) | _tokenize_name(workflow.get('name', '')),
+            'node_types': sorted({node.get('type', '').split('.')[-1] for node in workflow['nodes']} - {''}),
+            'node_names': [node.get('name', '') for node in workflow['nodes']],
+            'hash': file_sha256(path),
+            'skeleton': compact_skeleton(workflow)
+        }
+    return files
+
+
+def compact_skeleton(workflow: Dict[str, Any], max_nodes: int = SKELETON_MAX_NODES) -> str:
+    """Token-cheap outline of an n8n workflow: node names, short types, parameter keys and edges"""
+    nodes = workflow.get('nodes', [])
+    shown = nodes[:max_nodes]
+    shown_names = {node.get('name') for node in shown}
+
+    lines = [f"Example: {workflow.get('name', 'Workflow')} ({len(nodes)} nodes)", "Nodes:"]
+    for node in shown:
+        params = ", ".join(key for key in node.get('parameters', {}) if key != 'options')
+        node_type = node.get('type', '').split('.')[-1]
+        lines.append(f"- {node.get('name', '')} [{node_type}]" + (f" params: {params}" if params else ""))
+    if len(nodes) > max_nodes:
+        lines.append(f"- ... {len(nodes) - max_nodes} more nodes")
+
+    edges = []
+    for source, outputs in workflow.get('connections', {}).items():
+        if source not in shown_names:
+            continue
+        branches = []
+        for output in outputs.get('main', []):
+            targets = [link.get('node') for link in output or [] if link.get('node') in shown_names]
+            branches.append(", ".join(targets) if targets else "-")
+        if any(branch != "-" for branch in branches):
+            # One group per output; several groups mean an if/switch branch
+            edges.append(f"- {source} -> {' | '.join(branches)}")
+    if edges:
+        lines.append("Connections:")
+        lines.extend(edges)
+    return "\n".join(lines)
+
+
+def save_skeletons(files: Dict[str, Dict[str, Any]], path: str = SKELETON_FILE) -> int:
+    """Write the skeletons of discovered exports, keyed by file name, for use at generation time"""
+    skeletons = {
+        os.path.basename(file_path): {'name': info['name'], 'hash': info['hash'], 'skeleton': info['skeleton']}
+        for file_path, info in files.items()
+    }
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(skeletons, f, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, path)
+    return len(skeletons)
+
+
+class SkeletonStore:
+    def __init__(self, path: str = SKELETON_FILE, directory: str = "."):
+        """Access to the stored n8n exports: precomputed skeletons (loaded once) and the parsed workflows"""
+        self.path = path
+        self.directory = directory
+        self._skeletons = None
+        self._workflows: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        if self._skeletons is None:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._skeletons = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                self._skeletons = {}
+        return self._skeletons
+
+    def load_workflow(self, source_file: str) -> Optional[Dict[str, Any]]:
+        """The stored n8n export itself (parsed once, callers get a deep copy)"""
+        if not source_file:
+            return None
+        path = os.path.join(self.directory, os.path.basename(source_file))
+        with self._lock:
+            if path not in self._workflows:
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self._workflows[path] = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    return None
+            workflow = self._workflows[path]
+        return copy.deepcopy(workflow)
+
+    def get(self, source_file: str) -> Optional[str]:
+        """Skeleton for an export file name (as stored in the ChromaDB source_file metadata)"""
+        if not source_file:
+            return None
+        with self._lock:
+            entry = self._load().get(source_file)
+            if entry is not None:
+                return entry['skeleton']
+
+            path = os.path.join(self.directory, os.path.basename(source_file))
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    workflow = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return None
+            skeleton = compact_skeleton(workflow)
+            self._skeletons[source_file] = {'name': workflow.get('name', ''), 'hash': file_sha256(path),
+                                            'skeleton': skeleton}
+            return skeleton
+
+
+def match_workflow_file(title: str, files: Dict[str, Dict[str, Any]]) -> Optional[str]:
+    """Return the path of the n8n export that best matches a metadata title"""
+    title_tokens = _tokenize_name(title)
+    best_path, best_score = None, 0.0
+    for path, info in files.items():
+        union = title_tokens | info['tokens']
+        score = len(title_tokens & info['tokens']) / len(union) if union else 0.0
+        if score > best_score:
+            best_path, best_score = path, score
+    return best_path if best_score >= FILE_MATCH_THRESHOLD else None
+
+
+def entry_from_workflow_file(path: str, info: Dict[str, Any], domains: List[str]) -> Dict[str, Any]:
+    """Build a catalog entry for an n8n export that has no hand-written metadata"""
+    prefix = os.path.basename(path).split('_')[0]
+    domain = next((d for d in domains if d.lower() == prefix.lower()), prefix)
+    return {
+        'title': info['name'],
+        'description': f"n8n workflow with steps: {', '.join(info['node_names'][:12])}",
+        'domain': domain,
+        'tags': info['node_types'][:10],
+        'parameter_types': []
+    }
+
+
+def iter_catalog_entries(metadata_path: str = METADATA_FILE, directory: Optional[str] = None,
+                         domains: Optional[List[str]] = None) -> Iterator[Tuple[str, Dict[str, Any], Optional[str], str]]:
+    """Yield (workflow_id, entry, source_file, content_hash) for every catalog workflow
+
+    Entries come from workflow_metadata.json (streamed) and are linked to their n8n export so that
+    editing either one changes the hash. Exports with no metadata entry are yielded as entries of
+    their own.
+    """
+    directory = directory if directory is not None else os.path.dirname(os.path.abspath(metadata_path))
+    domains = domains or ["HR", "Marketing", "CRM", "Sales", "IT"]
+    files = discover_workflow_files(directory)
+    linked = set()
+    seen_ids = set()
+
+    def unique_id(title: str) -> str:
+        base = slugify(title)
+        workflow_id, n = base, 2
+        while workflow_id in seen_ids:
+            workflow_id, n = f"{base}-{n}", n + 1
+        seen_ids.add(workflow_id)
+        return workflow_id
+
+    for entry in iter_workflow_metadata(metadata_path):
+        source_file = match_workflow_file(entry.get('title', ''), files)
+        source_hash = files[source_file]['hash'] if source_file else ""
+        if source_file:
+            linked.add(source_file)
+        yield unique_id(entry.get('title', '')), entry, source_file, content_hash(entry, source_hash)
+
+    for path, info in files.items():
+        if path in linked:
+            continue
+        entry = entry_from_workflow_file(path, info, domains)
+        yield unique_id(entry['title']), entry, path, content_hash(entry, info['hash'])
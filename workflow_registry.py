@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+# Bundled registry of n8n node types and workflow patterns; bump "version" when editing it
+DEFAULT_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "workflow_registry.json")
+
+REQUIRED_NODE_FIELDS = ("type", "category", "description", "default_params")
+
+_REGISTRIES: Dict[str, "WorkflowRegistry"] = {}
+_REGISTRIES_LOCK = threading.Lock()
+
+
+class WorkflowRegistry:
+    def __init__(self, data: Dict[str, Any], content_hash: str, path: str = ""):
+        """Node types and workflow patterns from a registry file, with lookups precomputed
+
+        nodes maps a registry key ("webhook", "slack", ...) to its n8n type, category, description,
+        default parameters and, for branching nodes, the number of outputs. patterns are tried in
+        file order by select_pattern(); a pattern whose "when" is empty matches everything, so the
+        default pattern goes last. Pattern nodes are chained in order; an if/switch only fans out
+        where the pattern declares it in "branches" (see workflow_layout.chain_connections).
+        """
+        self.path = path
+        self.nodes: Dict[str, Dict[str, Any]] = data.get("nodes", {})
+        self.patterns: Dict[str, Dict[str, Any]] = {pattern["name"]: pattern for pattern in data.get("patterns", [])}
+        # File version for humans, content hash so an edit without a version bump still invalidates caches
+        self.version = f"{data.get('version', '0')}-{content_hash[:12]}"
+
+        self.by_category: Dict[str, List[str]] = {}
+        self.by_type: Dict[str, str] = {}
+        for key, info in self.nodes.items():
+            missing = [field for field in REQUIRED_NODE_FIELDS if field not in info]
+            if missing:
+                raise ValueError(f"Registry node '{key}' is missing {', '.join(missing)} ({path})")
+            self.by_category.setdefault(info["category"], []).append(key)
+            self.by_type.setdefault(info["type"], key)
+        if not self.patterns:
+            raise ValueError(f"Registry defines no workflow patterns ({path})")
+        for pattern in self.patterns.values():
+            self._check_branches(pattern)
+
+    def _check_branches(self, pattern: Dict[str, Any]):
+        """A branch must start before the last node, at a node with enough outputs, and cover the nodes right after it"""
+        nodes = pattern["nodes"]
+        for branch in pattern.get("branches", []):
+            start, runs = branch["node"], branch["outputs"]
+            source = nodes[start] if 0 <= start < len(nodes) else None
+            covered = sorted(index for run in runs for index in run)
+            if start >= len(nodes) - 1:
+                raise ValueError(f"Pattern '{pattern['name']}' branches from node {start}, "
+                                 f"which has no nodes after it ({self.path})")
+            if source is None or len(runs) > self.nodes.get(source, {}).get("outputs", 1):
+                raise ValueError(f"Pattern '{pattern['name']}' branches from node {start}, "
+                                 f"which has fewer than {len(runs)} outputs ({self.path})")
+            if covered != list(range(start + 1, start + 1 + len(covered))):
+                raise ValueError(f"Pattern '{pattern['name']}' branch at node {start} must cover "
+                                 f"the nodes right after it ({self.path})")
+
+    def get(self, key: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return self.nodes.get(key, default)
+
+    def key_for_type(self, n8n_type: str) -> Optional[str]:
+        """Registry key of an n8n node type ("n8n-nodes-base.slack" -> "slack")"""
+        return self.by_type.get(n8n_type)
+
+    def nodes_in(self, category: str) -> List[str]:
+        return self.by_category.get(category, [])
+
+    def select_pattern(self, keywords: Dict[str, List[str]]) -> Dict[str, Any]:
+        """First pattern whose conditions hold for the keyword feature vector
+
+        "groups" requires every listed keyword group to have a match; "keywords" requires the
+        listed keywords in their group.
+        """
+        for pattern in self.patterns.values():
+            when = pattern.get("when") or {}
+            if not all(keywords.get(group) for group in when.get("groups", [])):
+                continue
+            if not all(keyword in keywords.get(group, [])
+                       for group, required in when.get("keywords", {}).items() for keyword in required):
+                continue
+            return pattern
+        return list(self.patterns.values())[-1]
+
+
+def load_registry(path: Optional[str] = None) -> WorkflowRegistry:
+    """Registry for a file, parsed on first use and shared by every generator in the process"""
+    path = os.path.abspath(path or DEFAULT_REGISTRY_PATH)
+    registry = _REGISTRIES.get(path)
+    if registry is None:
+        with _REGISTRIES_LOCK:
+            registry = _REGISTRIES.get(path)
+            if registry is None:
+                with open(path, 'rb') as f:
+                    raw = f.read()
+                registry = WorkflowRegistry(json.loads(raw), hashlib.sha256(raw).hexdigest(), path)
+                _REGISTRIES[path] = registry
+    return registry
+
+
+def reload_registry(path: Optional[str] = None) -> WorkflowRegistry:
+    """Drop the memoized registry (e.g. after editing the file) and load it again"""
+    with _REGISTRIES_LOCK:
+        _REGISTRIES.pop(os.path.abspath(path or DEFAULT_REGISTRY_PATH), None)
+    return load_registry(path)
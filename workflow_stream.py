@@ -0,0 +1,159 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+_CLOSERS = {"}": "{", "]": "["}
+
+# Only quotes, backslashes and brackets change parser state; everything else is skipped in C
+_STRUCTURAL_RE = re.compile(r'[\\"{}\[\]]')
+
+
+class MalformedStreamError(ValueError):
+    """Raised as soon as streamed model output can no longer be a workflow JSON object"""
+
+
+class IncrementalWorkflowParser:
+    def __init__(self, max_chars: int = 200000):
+        """Scan streamed workflow JSON chunk by chunk and emit each node as soon as it is complete
+
+        Only string/escape state and a bracket stack are tracked, and the scan jumps straight between
+        structural characters, so the whole response is processed in a single linear pass.
+        Output is rejected early when it doesn't start with a JSON object (an optional ```json fence
+        is allowed), when brackets don't match, or when a completed node isn't valid JSON.
+        """
+        self.max_chars = max_chars
+        self.nodes: List[Dict[str, Any]] = []
+        self._chunks: List[str] = []
+        self._length = 0
+        # Chunks from absolute offset _pending_start on, trimmed to what an open node or key still needs
+        self._pending: List[str] = []
+        self._pending_start = 0
+        self._pos = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape_at = None
+        self._string_start = None
+        self._last_key: Optional[str] = None
+        self._in_nodes = False
+        self._node_start = None
+        self._started = False
+        self._done = False
+        self._json_start = 0
+        self._json_end = None
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far"""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+
+    def _slice(self, start: int, end: int) -> str:
+        """Text between two absolute offsets that are still pending"""
+        if len(self._pending) > 1:
+            self._pending = ["".join(self._pending)]
+        return self._pending[0][start - self._pending_start:end - self._pending_start]
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of model output and return the nodes completed by it"""
+        offset = self._length
+        self._chunks.append(chunk)
+        self._pending.append(chunk)
+        self._length += len(chunk)
+        if self._length > self.max_chars:
+            raise MalformedStreamError(f"Response exceeded {self.max_chars} characters")
+
+        if not self._started:
+            head = self._slice(self._pending_start, self._length).lstrip()
+            if head.startswith("```"):
+                newline = head.find("\n")
+                if newline == -1:
+                    return []
+                head = head[newline + 1:].lstrip()
+            elif "```".startswith(head):
+                # A fence split across chunks ("`", "``"): wait for the rest
+                return []
+            if not head:
+                return []
+            if head[0] != "{":
+                raise MalformedStreamError(f"Response does not start with a JSON object: {head[:40]!r}")
+            self._pos = self._json_start = self._length - len(head)
+            self._started = True
+            # The opening brace may sit in an earlier chunk; scan everything from it
+            chunk, offset = self._slice(self._pending_start, self._length), self._pending_start
+
+        completed = []
+        for match in _STRUCTURAL_RE.finditer(chunk, max(0, self._pos - offset)):
+            if self._done:
+                break
+            i = match.start() + offset
+            char = match.group()
+            if self._in_string:
+                if self._escape_at is not None:
+                    escaped = i == self._escape_at + 1
+                    self._escape_at = None
+                    if escaped:
+                        continue
+                if char == "\\":
+                    self._escape_at = i
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = self._slice(self._string_start + 1, i)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if char == "[" and len(self._stack) == 1 and self._last_key == "nodes":
+                    self._in_nodes = True
+                elif char == "{" and self._in_nodes and len(self._stack) == 2:
+                    self._node_start = i
+                self._stack.append(char)
+            elif char in "}]":
+                if not self._stack or self._stack[-1] != _CLOSERS[char]:
+                    raise MalformedStreamError(f"Unbalanced '{char}' at offset {i}")
+                self._stack.pop()
+                if self._in_nodes and len(self._stack) == 2 and char == "}":
+                    completed.append(self._parse_node(self._slice(self._node_start, i + 1)))
+                    self._node_start = None
+                elif self._in_nodes and len(self._stack) == 1:
+                    self._in_nodes = False
+                elif not self._stack:
+                    self._done = True
+                    self._json_end = i + 1
+        self._pos = self._length
+
+        # Drop text nothing refers to any more, so each feed only scans and keeps the new chunk
+        keep = self._length
+        if self._node_start is not None:
+            keep = self._node_start
+        if self._in_string and self._string_start < keep:
+            keep = self._string_start
+        if keep == self._length:
+            self._pending, self._pending_start = [], keep
+        elif keep > self._pending_start:
+            self._pending, self._pending_start = [self._slice(keep, self._length)], keep
+        self.nodes.extend(completed)
+        return completed
+
+    def _parse_node(self, fragment: str) -> Dict[str, Any]:
+        try:
+            node = json.loads(fragment)
+        except json.JSONDecodeError as e:
+            raise MalformedStreamError(f"Node {len(self.nodes) + 1} is not valid JSON: {e}")
+        if not isinstance(node, dict):
+            raise MalformedStreamError(f"Node {len(self.nodes) + 1} is not an object")
+        return node
+
+    @property
+    def complete(self) -> bool:
+        """True once the top-level object has been closed"""
+        return self._done
+
+    def finish(self) -> str:
+        """The workflow JSON text without fences; raises if the stream ended before the object was closed"""
+        if not self._done:
+            raise MalformedStreamError("Response ended before the workflow JSON was complete")
+        return self.text[self._json_start:self._json_end]